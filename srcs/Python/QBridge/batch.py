@@ -0,0 +1,49 @@
+from QBridge.quantumCircuit import ArrayQuantumCircuit
+from QBridge.simulators import CustomQCSimulator, runQiskitSimulation
+import multiprocessing
+import numpy as np
+import pathlib
+import time
+
+# runs in the worker processes, the state vector is written to a .npy file instead of being pickled
+# back to the main process
+def _simulateToFile(task):
+    index, circuit, backend, engine, directory = task
+    path = pathlib.Path(directory) / pathlib.Path(f"stateVector{index}.npy")
+
+    if backend == "custom":
+        simulator = CustomQCSimulator(circuit.nQubits, engine=engine)
+        startTime = time.time()
+        simulator._applyCircuit(circuit if isinstance(circuit, ArrayQuantumCircuit) else circuit.circuit)
+        # the blocked and chunked engines only apply the collected operations in getStateVector
+        stateVector = simulator.getStateVector()
+        endTime = time.time()
+    elif backend == "qiskit":
+        # the backend is kept per worker process by runQiskitSimulation
+        startTime = time.time()
+        stateVector, _ = runQiskitSimulation(circuit)
+        endTime = time.time()
+    else:
+        raise ValueError("backend must be custom or qiskit")
+
+    output = np.lib.format.open_memmap(path, mode="w+", dtype=np.complex128, shape=stateVector.shape)
+    output[:] = stateVector
+    output.flush()
+    del output
+    return index, str(path), endTime-startTime
+
+# Simulates many circuits on a pool of worker processes. Results are yielded as soon as they are
+# finished (not in input order) as (index, stateVector, runtime), the state vector is a read only
+# memory mapped array backed by stateVector<index>.npy in outputDirectory. The files stay there after
+# the generator is exhausted, a temporary directory may only be removed once the arrays are no longer
+# used (Windows refuses to delete files that are still mapped).
+def runBatchSimulation(circuits, outputDirectory, backend="custom", engine="vectorized", workers=None, chunkSize=1):
+    pathlib.Path(outputDirectory).mkdir(parents=True, exist_ok=True)
+
+    tasks = ((index, circuit, backend, engine, outputDirectory) for index, circuit in enumerate(circuits))
+    # Aer's thread pool does not survive a fork once it was used in this process, so the
+    # qiskit workers are started fresh
+    context = multiprocessing.get_context("spawn" if backend == "qiskit" else None)
+    with context.Pool(workers) as pool:
+        for index, path, runtime in pool.imap_unordered(_simulateToFile, tasks, chunksize=chunkSize):
+            yield index, np.load(path, mmap_mode="r"), runtime
@@ -0,0 +1,533 @@
+from QBridge.quantumCircuit import QuantumCircuit, ArrayQuantumCircuit
+from QBridge.simulators import CustomQCSimulator, FixedPointQCSimulator, runCustomSimulation, runQiskitSimulation
+from QBridge.compiler import FPGAQCCompiler
+from QBridge.optimizer import scheduleCircuit, countSweeps
+from QBridge.emulator import FPGAEmulator
+from QBridge.batch import runBatchSimulation
+from QBridge.tools import StateVectorDecoder, ReadbackMonitor, encodeStateVector, FRAME_LENGTH
+from QBridge.protocol import encodePacket, transferTime
+from QBridge.serialConnection import BoardConnection
+from QBridge.scheduler import BoardScheduler
+from QBridge.cache import PrefixCache
+import serial
+import threading
+import queue
+import numpy as np
+import argparse
+import json
+import os
+import pathlib
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+toffoliHeavyGates = ["h", "x", "t", "cnot", "ccnot", "ccnot", "ccnot", "ccnot"]
+
+# counts the "calculate state vector" instructions, every one of them is a full sweep on the FPGA
+def countCompiledGatePasses(circuit, multiControlSupport=False):
+    compiler = FPGAQCCompiler(multiControlSupport=multiControlSupport)
+    with tempfile.TemporaryDirectory() as directory:
+        compiler.compile(circuit, directory, enableTimer=False)
+    return compiler.program.count("01000000")
+
+# compares the 18 gate ccnot decomposition with the native doubly controlled X kernel
+def benchmarkNativeCcnot(nQubits=10, nGates=200, engine="vectorized", possibleGates=toffoliHeavyGates):
+    circuit = QuantumCircuit(nQubits)
+    circuit.createRandomCircuit(nGates, possibleGates=possibleGates)
+
+    results = {"nQubits": nQubits, "nGates": nGates, "engine": engine}
+    for label, nativeCcnot in [("decomposed", False), ("native", True)]:
+        simulator = CustomQCSimulator(nQubits, engine=engine, nativeCcnot=nativeCcnot)
+        startTime = time.time()
+        simulator.run(circuit.circuit)
+        endTime = time.time()
+        results[label] = {"gatePasses": simulator.gatePasses,
+                          "runtime": endTime-startTime,
+                          "compiledGatePasses": countCompiledGatePasses(circuit, multiControlSupport=nativeCcnot)}
+
+    results["gatePassReduction"] = results["decomposed"]["gatePasses"] / results["native"]["gatePasses"]
+    results["speedup"] = results["decomposed"]["runtime"] / results["native"]["runtime"]
+    return results
+
+# decodes a synthetic state vector dump in chunks of chunkSize bytes and compares the decoding
+# rate with the rate the UART delivers bytes at (10 bits per byte on the wire)
+def benchmarkSerialDecoder(nQubits=14, baudRate=460800, chunkSize=4096, repetitions=10):
+    random = np.random.default_rng(0)
+    stateVector = random.uniform(-1, 1, 2**nQubits) + 1j*random.uniform(-1, 1, 2**nQubits)
+    data = encodeStateVector(stateVector)
+
+    startTime = time.time()
+    for _ in range(repetitions):
+        decoder = StateVectorDecoder()
+        for i in range(0, len(data), chunkSize):
+            decoder.feed(data[i:i+chunkSize])
+    endTime = time.time()
+
+    bytesPerSecond = repetitions * len(data) / (endTime-startTime)
+    lineRate = baudRate / 10
+    return {"nQubits": nQubits, "bytes": len(data), "chunkSize": chunkSize,
+            "decodedBytesPerSecond": bytesPerSecond,
+            "decodedAmplitudesPerSecond": bytesPerSecond / FRAME_LENGTH,
+            "lineRateBytesPerSecond": lineRate,
+            "speedupOverLineRate": bytesPerSecond / lineRate}
+
+# memory per gate and gate iteration rate of the dict based QuantumCircuit and ArrayQuantumCircuit
+def benchmarkCircuitStorage(nQubits=14, nGates=1000000):
+    results = {"nQubits": nQubits, "nGates": nGates}
+    for label, circuitClass in [("dict", QuantumCircuit), ("array", ArrayQuantumCircuit)]:
+        tracemalloc.start()
+        circuit = circuitClass(nQubits)
+        circuit.createRandomCircuit(nGates)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        startTime = time.time()
+        targets = 0
+        if circuitClass == QuantumCircuit:
+            for gate in circuit.circuit:
+                targets += gate["target"]
+        else:
+            for opcode, target, control1, control2 in circuit:
+                targets += target
+        endTime = time.time()
+
+        results[label] = {"bytesPerGate": memory / nGates, "gatesPerSecond": nGates / (endTime-startTime)}
+    return results
+
+# circuits per second of runBatchSimulation for different numbers of worker processes
+def benchmarkBatchSimulation(nQubits=12, nGates=200, nCircuits=64, workerCounts=[1, 2, 4, 8], engine="vectorized"):
+    circuits = []
+    for _ in range(nCircuits):
+        circuit = ArrayQuantumCircuit(nQubits)
+        circuit.createRandomCircuit(nGates)
+        circuits.append(circuit)
+
+    results = {"nQubits": nQubits, "nGates": nGates, "nCircuits": nCircuits, "circuitsPerSecond": {}}
+    for workers in workerCounts:
+        with tempfile.TemporaryDirectory() as directory:
+            startTime = time.time()
+            for _ in runBatchSimulation(circuits, directory, engine=engine, workers=workers):
+                pass
+            endTime = time.time()
+        results["circuitsPerSecond"][workers] = nCircuits / (endTime-startTime)
+    return results
+
+# maximum absolute error of the fixed point simulation against complex128 after every checkpoint
+# gate count, used to pick the cheapest precision that still meets an accuracy target
+def benchmarkFixedPointError(nQubits=10, gateCounts=[10, 100, 1000], precisions=[16, 20, 24, 32]):
+    circuit = ArrayQuantumCircuit(nQubits)
+    circuit.createRandomCircuit(max(gateCounts))
+    gates = circuit.circuit
+
+    reference = CustomQCSimulator(nQubits, engine="vectorized")
+    simulators = {precision: FixedPointQCSimulator(nQubits, precision) for precision in precisions}
+    results = {"nQubits": nQubits, "maxError": {precision: {} for precision in precisions}}
+    done = 0
+    for gateCount in sorted(gateCounts):
+        reference._applyCircuit(gates[done:gateCount])
+        for precision, simulator in simulators.items():
+            simulator._applyCircuit(gates[done:gateCount])
+            error = np.abs(simulator.getStateVector() - reference.getStateVector()).max()
+            results["maxError"][precision][gateCount] = float(error)
+        done = gateCount
+    return results
+
+# sends a state vector from a pty stand-in for the FPGA at every baud rate and reads it back through
+# ReadbackMonitor like serialInterface.py does
+def benchmarkSerialReadback(nQubits=10, baudRates=[115200, 460800, 921600]):
+    # FakeBoard needs a pseudo terminal (Unix only), the rest of the benchmarks also run on Windows
+    from QBridge.fakeBoard import FakeBoard
+    random = np.random.default_rng(0)
+    stateVector = random.uniform(-1, 1, 2**nQubits) + 1j*random.uniform(-1, 1, 2**nQubits)
+    data = encodeStateVector(stateVector)
+
+    results = {"nQubits": nQubits, "bytes": len(data), "baudRates": {}}
+    for baudRate in baudRates:
+        board = FakeBoard()
+        port = serial.Serial(board.portName, baudRate, timeout=0)
+        monitor = ReadbackMonitor(expectedAmplitudes=len(stateVector))
+        sender = threading.Thread(target=board.send, args=(data, baudRate))
+        sender.start()
+
+        lastDataTime = time.time()
+        while sender.is_alive() or time.time() - lastDataTime < 0.1:
+            if port.in_waiting:
+                lastDataTime = time.time()
+                monitor.feed(port.read(port.in_waiting), lastDataTime)
+            else:
+                time.sleep(0.001)
+        sender.join()
+        port.close()
+        board.close()
+
+        report = monitor.report()
+        report["lineRateBytesPerSecond"] = baudRate / FakeBoard.bitsPerByte
+        results["baudRates"][baudRate] = report
+    return results
+
+# bytes and readback time at baudRate of the legacy frames and every packet mode for the output of a
+# random circuit and of a GHZ circuit (two nonzero amplitudes)
+def benchmarkWireEncoding(nQubits=14, nGates=200, baudRate=460800):
+    random = QuantumCircuit(nQubits)
+    random.createRandomCircuit(nGates)
+    ghz = ghzWorkload(nQubits)
+
+    results = {"nQubits": nQubits, "baudRate": baudRate, "circuits": {}}
+    for label, circuit in [("random", random), ("ghz", ghz)]:
+        stateVector = CustomQCSimulator(nQubits, engine="vectorized").run(circuit.circuit)
+        # the FPGA sends 12 bit slots per byte, see FPGAEmulator.uartSlotsPerFrame
+        legacyBytes = len(encodeStateVector(stateVector))
+        entry = {"frames": {"bytes": legacyBytes, "transferTime": transferTime(legacyBytes, baudRate, bitsPerByte=12)}}
+        for mode in ["dense", "runLength", "sparse", "auto"]:
+            packetBytes = len(encodePacket(stateVector, mode))
+            entry[mode] = {"bytes": packetBytes, "transferTime": transferTime(packetBytes, baudRate),
+                           "speedup": entry["frames"]["transferTime"] / transferTime(packetBytes, baudRate)}
+        results["circuits"][label] = entry
+    return results
+
+# throughput of the BoardScheduler with boardCount fake boards, once with a results queue per connection
+# and once with one queue shared by all of them like connectAll sets it up. mismatched counts the
+# results whose state vector is not the one of their program.
+def benchmarkBoardScheduler(nQubits=8, nGates=50, nCircuits=16, boardCounts=[1, 2, 4], baudRate=460800):
+    from QBridge.fakeBoard import FakeBoard # Unix only, see benchmarkSerialReadback
+    results = {"nQubits": nQubits, "nGates": nGates, "nCircuits": nCircuits, "boards": {}, "sharedQueue": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        programs = []
+        references = []
+        for i in range(nCircuits):
+            circuit = QuantumCircuit(nQubits)
+            circuit.createRandomCircuit(nGates)
+            FPGAQCCompiler().compile(circuit, directory, f"FPGAProgram{i}")
+            programs.append((directory, f"FPGAProgram{i}"))
+            references.append(CustomQCSimulator(nQubits, engine="vectorized").run(circuit.circuit))
+
+        for label in ["boards", "sharedQueue"]:
+            for boardCount in boardCounts:
+                boards = [FakeBoard() for _ in range(boardCount)]
+                sharedQueue = queue.Queue() if label == "sharedQueue" else None
+                connections = []
+                for i, board in enumerate(boards):
+                    board.serve(baudRate)
+                    connections.append(BoardConnection(serial.Serial(board.portName, baudRate), f"board{i}", sharedQueue,
+                                                       expectedAmplitudes=2**nQubits))
+                scheduler = BoardScheduler(connections)
+                scheduled = scheduler.run(programs)
+                results[label][boardCount] = scheduler.report()
+                results[label][boardCount]["mismatched"] = sum(1 for result, reference in zip(scheduled, references)
+                                                               if result == None or not "stateVector" in result
+                                                               or np.abs(result["stateVector"] - reference).max() > 1e-6)
+                for connection in connections:
+                    connection.close()
+                for board in boards:
+                    board.close()
+    return results
+
+# instructions and emulated timer cycles of random circuits like randomBenchmark.prg before and after scheduleCircuit
+def benchmarkGateScheduling(nQubits=4, nGates=30, repetitions=10):
+    results = {"nQubits": nQubits, "nGates": nGates, "instructions": {"before": 0, "after": 0}, "timerCycles": {"before": 0, "after": 0}}
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repetitions):
+            circuit = QuantumCircuit(nQubits)
+            circuit.createRandomCircuit(nGates)
+            scheduledCircuit, _ = scheduleCircuit(circuit)
+            for label, candidate in [("before", circuit), ("after", scheduledCircuit)]:
+                compiler = FPGAQCCompiler()
+                compiler.compile(candidate, directory)
+                emulator = FPGAEmulator(simulate=False)
+                emulator.load(compiler.getProgramBinary())
+                results["instructions"][label] += len(compiler.program)
+                results["timerCycles"][label] += emulator.run()["timerCycles"]
+    results["instructionReduction"] = 1 - results["instructions"]["after"] / results["instructions"]["before"]
+    results["cycleReduction"] = 1 - results["timerCycles"]["after"] / results["timerCycles"]["before"]
+    return results
+
+
+# runtime of the threaded engine for every thread count and its speedup over the vectorized engine,
+# 28 qubits need 4 GiB for the state vector plus the temporaries of one gate
+def benchmarkThreadedEngine(qubitCounts=[16, 20, 24, 28], threadCounts=[1, 2, 4, 8], nGates=20, repetitions=3):
+    def fastestRun(nQubits, circuit, engine, threads=None):
+        runtimes = []
+        for _ in range(repetitions):
+            simulator = CustomQCSimulator(nQubits, engine=engine, threads=threads)
+            startTime = time.time()
+            simulator.run(circuit.circuit)
+            runtimes.append(time.time() - startTime)
+            del simulator
+        return min(runtimes)
+
+    results = {"nGates": nGates, "cpus": os.cpu_count(), "qubits": {}}
+    for nQubits in qubitCounts:
+        circuit = randomWorkload(nQubits, nGates)
+        vectorizedRuntime = fastestRun(nQubits, circuit, "vectorized")
+        entry = {"vectorized": vectorizedRuntime, "threaded": {}}
+        for threads in threadCounts:
+            runtime = fastestRun(nQubits, circuit, "threaded", threads)
+            entry["threaded"][threads] = {"runtime": runtime, "speedup": vectorizedRuntime / runtime}
+        results["qubits"][nQubits] = entry
+    return results
+
+# runtime of the blocked engine for every tile size against the vectorized engine and the bytes moved
+# per gate of both (see runBlocked)
+def benchmarkBlockedEngine(qubitCounts=[16, 20, 22], blockQubitCounts=[12, 14, 16, 18], nGates=200):
+    results = {"nGates": nGates, "qubits": {}}
+    for nQubits in qubitCounts:
+        circuit = randomWorkload(nQubits, nGates)
+        simulator = CustomQCSimulator(nQubits, engine="vectorized")
+        startTime = time.time()
+        reference = simulator.run(circuit.circuit)
+        entry = {"vectorized": time.time() - startTime, "blocked": {}}
+        for blockQubits in blockQubitCounts:
+            simulator = CustomQCSimulator(nQubits, engine="blocked", blockQubits=blockQubits)
+            startTime = time.time()
+            stateVector = simulator.run(circuit.circuit)
+            runtime = time.time() - startTime
+            entry["blocked"][blockQubits] = {"runtime": runtime, "speedup": entry["vectorized"] / runtime,
+                                             "bytesPerGateBefore": simulator.blockStats["bytesPerGateUnblocked"],
+                                             "bytesPerGateAfter": simulator.blockStats["bytesPerGate"],
+                                             "swaps": simulator.blockStats["swaps"],
+                                             "maxError": float(np.abs(stateVector - reference).max())}
+        results["qubits"][nQubits] = entry
+    return results
+
+# runtime and peak memory of the chunked engine on a memory mapped state vector in a temporary
+# directory, compared with the vectorized engine in memory. The memory map itself is not traced, so
+# memoryPeak is what has to fit in RAM.
+def benchmarkOutOfCore(nQubits=24, nGates=50, chunkQubits=22, dtypes=[np.complex128, np.complex64]):
+    circuit = randomWorkload(nQubits, nGates)
+    results = {"nQubits": nQubits, "nGates": nGates, "chunkQubits": chunkQubits}
+    tracemalloc.start()
+    startTime = time.time()
+    reference = CustomQCSimulator(nQubits, engine="vectorized").run(circuit.circuit)
+    results["vectorized"] = {"runtime": time.time() - startTime, "memoryPeak": tracemalloc.get_traced_memory()[1]}
+    tracemalloc.stop()
+    for dtype in dtypes:
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            startTime = time.time()
+            simulator = CustomQCSimulator(nQubits, engine="chunked", chunkQubits=chunkQubits, dtype=dtype,
+                                          path=pathlib.Path(directory) / pathlib.Path("stateVector.npy"))
+            stateVector = simulator.run(circuit.circuit)
+            results[np.dtype(dtype).name] = {"runtime": time.time() - startTime, "memoryPeak": tracemalloc.get_traced_memory()[1],
+                                             "fileSize": stateVector.nbytes, "passes": simulator.blockStats["passes"],
+                                             "maxError": float(np.abs(stateVector - reference).max())}
+            tracemalloc.stop()
+            del simulator, stateVector
+    return results
+
+# sweep of nCircuits circuits that share a random prefix and end in up to maxSuffixGates random gates,
+# simulated from scratch and through a PrefixCache
+def benchmarkPrefixCache(nQubits=14, prefixGates=500, maxSuffixGates=8, nCircuits=50, maxBytes=2**30, checkpointInterval=16):
+    prefix = randomWorkload(nQubits, prefixGates)
+    circuits = []
+    for i in range(nCircuits):
+        circuit = QuantumCircuit(nQubits)
+        circuit.circuit = list(prefix.circuit)
+        random.seed(i + 1)
+        circuit.createRandomCircuit(random.randint(1, maxSuffixGates))
+        circuits.append(circuit)
+
+    startTime = time.time()
+    for circuit in circuits:
+        CustomQCSimulator(nQubits, engine="vectorized").run(circuit.circuit)
+    uncachedRuntime = time.time() - startTime
+
+    cache = PrefixCache(maxBytes, checkpointInterval)
+    startTime = time.time()
+    for circuit in circuits:
+        cache.run(circuit)
+    cachedRuntime = time.time() - startTime
+    return {"uncached": uncachedRuntime, "cached": cachedRuntime, "speedup": uncachedRuntime / cachedRuntime, "cache": cache.stats()}
+
+# Workloads of the benchmark suite, every function returns a QuantumCircuit with nQubits qubits
+
+def randomWorkload(nQubits, nGates=200, seed=0):
+    random.seed(seed)
+    circuit = QuantumCircuit(nQubits)
+    circuit.createRandomCircuit(nGates)
+    return circuit
+
+def ghzWorkload(nQubits):
+    circuit = QuantumCircuit(nQubits)
+    circuit.h(0)
+    for qubit in range(nQubits-1):
+        circuit.cnot(qubit+1, qubit)
+    return circuit
+
+# depth forward CNOT ladders over all qubits after a layer of H gates
+def cnotLadderWorkload(nQubits, depth=10):
+    circuit = QuantumCircuit(nQubits)
+    for qubit in range(nQubits):
+        circuit.h(qubit)
+    for _ in range(depth):
+        for qubit in range(nQubits-1):
+            circuit.cnot(qubit+1, qubit)
+    return circuit
+
+# X on target controlled by all controls, with a chain of ccnot gates over the ancilla qubits
+def _multiControlledX(circuit, target, controls, ancillas):
+    if len(controls) == 1:
+        circuit.cnot(target, controls[0])
+        return
+    if len(controls) == 2:
+        circuit.ccnot(target, controls[0], controls[1])
+        return
+    chain = [(ancillas[0], controls[0], controls[1])]
+    for i in range(2, len(controls)-1):
+        chain.append((ancillas[i-1], ancillas[i-2], controls[i]))
+    for gate in chain:
+        circuit.ccnot(*gate)
+    circuit.ccnot(target, ancillas[len(controls)-3], controls[-1])
+    for gate in reversed(chain):
+        circuit.ccnot(*gate)
+
+# Grover search over nData = (nQubits+3)//2 qubits with nData-3 ancillas for the multi controlled Z.
+# The oracle marks the state with qubit 0 = 0 and all other data qubits 1, for 3 qubits and one
+# iteration this gives the same state vector as FPGAPrograms/groversAlgorithm.prg
+def groverWorkload(nQubits, iterations=1):
+    nData = max(2, (nQubits+3)//2) if nQubits >= 3 else nQubits
+    data = list(range(nData))
+    ancillas = list(range(nData, nQubits))
+    circuit = QuantumCircuit(nQubits)
+
+    def multiControlledZ():
+        circuit.h(data[-1])
+        _multiControlledX(circuit, data[-1], data[:-1], ancillas)
+        circuit.h(data[-1])
+
+    for qubit in data:
+        circuit.h(qubit)
+    for _ in range(iterations):
+        circuit.x(data[0])
+        multiControlledZ()
+        circuit.x(data[0])
+        for qubit in data:
+            circuit.h(qubit)
+        for qubit in data:
+            circuit.x(qubit)
+        multiControlledZ()
+        for qubit in data:
+            circuit.x(qubit)
+        for qubit in data:
+            circuit.h(qubit)
+    return circuit
+
+workloads = {"random": randomWorkload, "grover": groverWorkload, "ghz": ghzWorkload, "cnotLadder": cnotLadderWorkload}
+
+def _customBackend(circuit):
+    tracemalloc.start()
+    _, timing = runCustomSimulation(circuit, engine="vectorized")
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timing["execution"], timing, peakMemory, countSweeps(circuit)
+
+def _qiskitBackend(circuit):
+    # runQiskitSimulation shares one runner across the suite, the backend lookup is not part of any measurement
+    # Aer allocates the state vector in C++, outside of tracemalloc
+    _, timing = runQiskitSimulation(circuit)
+    return timing["execution"], timing, None, len(circuit.circuit)
+
+# the FPGA runtime is the timer value predicted by FPGAEmulator, the readback is reported as its own phase
+def _fpgaBackend(circuit):
+    compiler = FPGAQCCompiler()
+    with tempfile.TemporaryDirectory() as directory:
+        compiler.compile(circuit, directory)
+    emulator = FPGAEmulator(simulate=False)
+    emulator.load(compiler.getProgramBinary())
+    report = emulator.run()
+    timing = {"execution": report["timerRuntime"], "readback": report["serialTransferTime"],
+              "total": report["runtime"]}
+    return report["timerRuntime"], timing, None, compiler.program.count("01000000"), report["timerCycles"]
+
+backends = {"custom": _customBackend, "qiskit": _qiskitBackend, "fpga": _fpgaBackend}
+
+# Runs every workload on every backend for every qubit count, the FPGA only up to FPGAQCCompiler.maxQubits.
+# Every result has gates/s, amplitude updates/s (state vector sweeps * 2^nQubits per second), peak
+# memory of the Python/numpy allocations and the time of every phase. Results are written as JSON to
+# output if a path is given.
+def runBenchmarkSuite(qubitCounts=[4, 8, 12, 14, 16], workloadNames=list(workloads), backendNames=list(backends), repetitions=1, output=None):
+    results = []
+    for workloadName in workloadNames:
+        for nQubits in qubitCounts:
+            circuit = workloads[workloadName](nQubits)
+            for backendName in backendNames:
+                if backendName == "fpga" and nQubits > FPGAQCCompiler.maxQubits:
+                    continue
+                best = None
+                for _ in range(repetitions):
+                    measurement = backends[backendName](circuit)
+                    if best == None or measurement[0] < best[0]:
+                        best = measurement
+                runtime, timing, peakMemory, sweeps = best[:4]
+                result = {"workload": workloadName, "nQubits": nQubits, "backend": backendName,
+                          "gates": len(circuit.circuit), "sweeps": sweeps, "runtime": runtime,
+                          "gatesPerSecond": len(circuit.circuit) / runtime if runtime > 0 else None,
+                          "amplitudeUpdatesPerSecond": sweeps * 2**nQubits / runtime if runtime > 0 else None,
+                          "peakMemory": peakMemory, "phases": timing}
+                if backendName == "fpga":
+                    result["timerCycles"] = best[4]
+                results.append(result)
+
+    suite = {"machine": {"platform": platform.platform(), "processor": platform.processor(), "python": platform.python_version(),
+                         "numpy": np.__version__},
+             "time": time.time(), "results": results}
+    if output != None:
+        pathlib.Path(output).write_text(json.dumps(suite, indent=1))
+    return suite
+
+# Compares a suite with a stored baseline suite. A result is a regression if its gates/s dropped by
+# more than tolerance, its peak memory grew by more than tolerance or, for the deterministic FPGA
+# timer, if it needs more cycles.
+def compareToBaseline(suite, baseline, tolerance=0.2):
+    key = lambda result: (result["workload"], result["nQubits"], result["backend"])
+    baselineResults = {key(result): result for result in baseline["results"]}
+    comparison = {"regressions": [], "improvements": [], "missing": []}
+    for result in suite["results"]:
+        reference = baselineResults.get(key(result))
+        if reference == None:
+            comparison["missing"].append(key(result))
+            continue
+        entry = {"workload": result["workload"], "nQubits": result["nQubits"], "backend": result["backend"]}
+        regressed = False
+        improved = False
+        if result["gatesPerSecond"] != None and reference["gatesPerSecond"] != None:
+            entry["gatesPerSecondRatio"] = result["gatesPerSecond"] / reference["gatesPerSecond"]
+            regressed |= entry["gatesPerSecondRatio"] < 1 - tolerance
+            improved |= entry["gatesPerSecondRatio"] > 1 + tolerance
+        if result["peakMemory"] != None and reference["peakMemory"]:
+            entry["peakMemoryRatio"] = result["peakMemory"] / reference["peakMemory"]
+            regressed |= entry["peakMemoryRatio"] > 1 + tolerance
+        if "timerCycles" in result and "timerCycles" in reference:
+            entry["timerCyclesChange"] = result["timerCycles"] - reference["timerCycles"]
+            regressed |= entry["timerCyclesChange"] > 0
+            improved |= entry["timerCyclesChange"] < 0
+        if regressed:
+            comparison["regressions"].append(entry)
+        elif improved:
+            comparison["improvements"].append(entry)
+    return comparison
+
+# python -m QBridge.benchmarks --output results.json [--baseline baseline.json], exits with 1 on regressions
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross backend benchmark suite")
+    parser.add_argument("--qubits", type=int, nargs="+", default=[4, 8, 12, 14, 16])
+    parser.add_argument("--workloads", nargs="+", default=list(workloads), choices=list(workloads))
+    parser.add_argument("--backends", nargs="+", default=list(backends), choices=list(backends))
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--output", default="benchmarkResults.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    arguments = parser.parse_args()
+
+    suite = runBenchmarkSuite(arguments.qubits, arguments.workloads, arguments.backends, arguments.repetitions, arguments.output)
+    for result in suite["results"]:
+        print(f"{result['workload']:>10} {result['nQubits']:>3} {result['backend']:>7}: {result['runtime']:.6f}s, "
+              f"{result['amplitudeUpdatesPerSecond']:.3e} amplitude updates/s")
+
+    if arguments.baseline != None:
+        comparison = compareToBaseline(suite, json.loads(pathlib.Path(arguments.baseline).read_text()), arguments.tolerance)
+        print(json.dumps(comparison, indent=1))
+        if len(comparison["regressions"]) > 0:
+            sys.exit(1)
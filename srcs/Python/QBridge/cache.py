@@ -0,0 +1,210 @@
+from QBridge.compiler import FPGAQCCompiler
+from QBridge.simulators import CustomQCSimulator
+import numpy as np
+import collections
+import hashlib
+import json
+import os
+import pathlib
+import io
+
+# canonical hash of the circuit, the number of qubits, the timer setting and the compiler version
+def circuitHash(circuit, enableTimer=True, multiControlSupport=False):
+    gates = []
+    for gate in circuit.circuit:
+        entry = [gate["type"], gate["target"], gate["control1"], gate["control2"]]
+        if "matrix" in gate:
+            entry.append([[float(x).hex() for x in (value.real, value.imag)] for value in np.asarray(gate["matrix"], dtype=np.complex128).ravel()])
+        gates.append(entry)
+    description = {"nQubits": circuit.nQubits, "enableTimer": enableTimer, "multiControlSupport": multiControlSupport,
+                   "compilerVersion": FPGAQCCompiler.version, "circuit": gates}
+    return hashlib.sha256(json.dumps(description, separators=(",", ":")).encode()).hexdigest()
+
+# Content addressed on disk cache for compiled programs and reference state vectors. Every entry is
+# a file named <key><extension>, the least recently used files are deleted once the cache grows
+# beyond maxBytes.
+class CompileCache():
+    programExtensions = [".prg", ".bin", ".comments.json"]
+
+    def __init__(self, directory, maxBytes=2**30):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key, extension):
+        return self.directory / pathlib.Path(f"{key}{extension}")
+
+    def get(self, key, extension):
+        path = self._path(key, extension)
+        if not path.exists():
+            return None
+        os.utime(path) # mark as recently used
+        return path.read_bytes()
+
+    def put(self, key, extension, data):
+        path = self._path(key, extension)
+        temporaryPath = self._path(key, extension + ".tmp")
+        temporaryPath.write_bytes(data)
+        os.replace(temporaryPath, path)
+        self._evict()
+
+    def _evict(self):
+        files = [(path.stat().st_mtime, path.stat().st_size, path) for path in self.directory.iterdir() if path.is_file()]
+        size = sum(file[1] for file in files)
+        for _, fileSize, path in sorted(files):
+            if size <= self.maxBytes:
+                break
+            path.unlink()
+            size -= fileSize
+
+    # same interface as FPGAQCCompiler.compile, the program is only compiled if it is not cached yet
+    def compile(self, circuit, filepath, filename="FPGAProgram", enableTimer=True, multiControlSupport=False):
+        key = circuitHash(circuit, enableTimer, multiControlSupport)
+        artifacts = [self.get(key, extension) for extension in self.programExtensions]
+
+        if any(artifact == None for artifact in artifacts):
+            self.misses += 1
+            compiler = FPGAQCCompiler(multiControlSupport=multiControlSupport)
+            compiler.compile(circuit, filepath, filename, enableTimer=enableTimer, binary=True)
+            for extension in self.programExtensions:
+                self.put(key, extension, (pathlib.Path(filepath) / pathlib.Path(f"{filename}{extension}")).read_bytes())
+        else:
+            self.hits += 1
+            for extension, artifact in zip(self.programExtensions, artifacts):
+                (pathlib.Path(filepath) / pathlib.Path(f"{filename}{extension}")).write_bytes(artifact)
+        return key
+
+    def getStateVector(self, key, backend="custom"):
+        data = self.get(key, f".{backend}.npy")
+        if data == None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return np.load(io.BytesIO(data))
+
+    def putStateVector(self, key, stateVector, backend="custom"):
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(stateVector))
+        self.put(key, f".{backend}.npy", buffer.getvalue())
+
+    # reference state vector of the custom simulator, only simulated on a cache miss
+    def referenceStateVector(self, circuit, enableTimer=True, engine="vectorized"):
+        key = circuitHash(circuit, enableTimer)
+        stateVector = self.getStateVector(key)
+        if stateVector is None:
+            simulator = CustomQCSimulator(circuit.nQubits, engine=engine)
+            stateVector = simulator.run(circuit.circuit)
+            self.putStateVector(key, stateVector)
+        return stateVector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hitRate": self.hits / total if total > 0 else 0}
+
+# hashable key of one gate dict, equal for gates with the same effect
+def _gateKey(gate):
+    matrix = None
+    if "matrix" in gate:
+        matrix = tuple(np.asarray(gate["matrix"], dtype=np.complex128).ravel().tolist())
+    return (gate["type"], gate["target"], gate["control1"], gate["control2"], matrix)
+
+class _PrefixNode():
+    def __init__(self, parent=None, key=None, depth=0):
+        self.parent = parent
+        self.key = key
+        self.depth = depth
+        self.children = {}
+        self.stateVector = None # checkpoint after the first depth gates
+
+# In memory cache of intermediate state vectors for circuits that share a gate prefix, e.g. parameter
+# or oracle sweeps. The gates of every simulated circuit are inserted into a trie, the state vector is
+# checkpointed every checkpointInterval gates and after the last gate. run() resumes from the longest
+# prefix that has a checkpoint. Checkpoints are evicted least recently used first once they take more
+# than maxBytes.
+class PrefixCache():
+    def __init__(self, maxBytes=2**30, checkpointInterval=16, engine="vectorized", nativeCcnot=False):
+        self.maxBytes = maxBytes
+        self.checkpointInterval = checkpointInterval
+        self.engine = engine
+        self.nativeCcnot = nativeCcnot
+        self.roots = {} # one trie per number of qubits
+        self.checkpoints = collections.OrderedDict() # node -> None, least recently used first
+        self.bytes = 0
+        self.circuits = 0
+        self.hits = 0
+        self.gatesSkipped = 0
+        self.gatesSimulated = 0
+        self.evictions = 0
+
+    # same result as CustomQCSimulator(circuit.nQubits, engine).run(circuit.circuit)
+    def run(self, circuit):
+        # built once, circuit.circuit creates a new list of dicts for every call on an ArrayQuantumCircuit
+        gates = circuit.circuit
+        keys = [_gateKey(gate) for gate in gates]
+        node = self.roots.setdefault(circuit.nQubits, _PrefixNode())
+        resume = node
+        for key in keys:
+            if not key in node.children:
+                break
+            node = node.children[key]
+            if node.stateVector is not None:
+                resume = node
+
+        simulator = CustomQCSimulator(circuit.nQubits, engine=self.engine, nativeCcnot=self.nativeCcnot)
+        self.circuits += 1
+        if resume.depth > 0:
+            self.hits += 1
+            self.checkpoints.move_to_end(resume)
+            simulator.stateVector.reshape(-1)[:] = resume.stateVector
+        self.gatesSkipped += resume.depth
+        self.gatesSimulated += len(keys) - resume.depth
+
+        node = resume
+        start = resume.depth
+        while start < len(keys):
+            stop = min(len(keys), (start // self.checkpointInterval + 1) * self.checkpointInterval)
+            simulator._applyCircuit(gates[start:stop])
+            for depth in range(start, stop):
+                node = node.children.setdefault(keys[depth], _PrefixNode(node, keys[depth], depth+1))
+            self._checkpoint(node, simulator.getStateVector())
+            start = stop
+        # nothing is kept for gates after the last stored checkpoint, e.g. if a state vector is larger than maxBytes
+        self._prune(node)
+        return simulator.getStateVector()
+
+    def _checkpoint(self, node, stateVector):
+        if node.stateVector is not None:
+            self.checkpoints.move_to_end(node)
+            return
+        if stateVector.nbytes > self.maxBytes:
+            return
+        node.stateVector = np.array(stateVector)
+        self.checkpoints[node] = None
+        self.bytes += node.stateVector.nbytes
+        while self.bytes > self.maxBytes:
+            self._evict(next(iter(self.checkpoints)))
+
+    def _evict(self, node):
+        del self.checkpoints[node]
+        self.bytes -= node.stateVector.nbytes
+        node.stateVector = None
+        self.evictions += 1
+        self._prune(node)
+
+    # drops the branch up to the last node that is still needed
+    def _prune(self, node):
+        while node.parent != None and len(node.children) == 0 and node.stateVector is None:
+            del node.parent.children[node.key]
+            node = node.parent
+
+    def clear(self):
+        self.roots = {}
+        self.checkpoints.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {"circuits": self.circuits, "hits": self.hits, "hitRate": self.hits / self.circuits if self.circuits > 0 else 0,
+                "gatesSkipped": self.gatesSkipped, "gatesSimulated": self.gatesSimulated,
+                "checkpoints": len(self.checkpoints), "bytes": self.bytes, "evictions": self.evictions}
@@ -1,9 +1,15 @@
+from QBridge.quantumCircuit import ArrayQuantumCircuit, GATE_TYPES
 import pathlib
+import json
 
 
 class FPGAQCCompiler():
     maxQubits = 14
-    def __init__(self):
+    version = "3.0.1" # instruction set version 3.0, increment the last number whenever the generated programs change
+    # multiControlSupport: set to True when the hardware decodes the "1111" (set second control
+    # qubit) instruction, the ccnot gate is then compiled to a single state vector calculation
+    # instead of the 18 gate decomposition
+    def __init__(self, multiControlSupport=False):
         self.program = []
         self.comments = []
         self.nQubits = None
@@ -11,14 +17,42 @@ class FPGAQCCompiler():
         self.targetQubit = None
         self.controlQubit = None
         self.GateAsControl = False
+        self.multiControlSupport = multiControlSupport
+        self.secondControlQubit = None
+        self.GateAsSecondControl = False
 
-    def compile(self, circuit, filepath, filename="FPGAProgram", enableTimer=True):
+    # writes the program as text (filename.prg) and, if binary is True, as a raw image with one byte
+    # per instruction (filename.bin) with the comments in a sidecar map (filename.comments.json)
+    def compile(self, circuit, filepath, filename="FPGAProgram", enableTimer=True, binary=True):
         self._doNothing()
         if enableTimer:
             self._startTimer()
         
         self._initCircuit(circuit.nQubits)
-        for gate in circuit.circuit:
+        if isinstance(circuit, ArrayQuantumCircuit):
+            self._compileOpcodes(circuit)
+        else:
+            self._compileGates(circuit.circuit)
+        
+        if enableTimer:
+            self._stopTimer()
+        
+        self._serialTransmitStateVector()
+        self._halt()
+        path = pathlib.Path(filepath) / pathlib.Path(f"{filename}.prg")
+        with open(path, "w") as f:
+            f.write(self.getProgramText())
+
+        if binary:
+            path = pathlib.Path(filepath) / pathlib.Path(f"{filename}.bin")
+            with open(path, "wb") as f:
+                f.write(self.getProgramBinary())
+            path = pathlib.Path(filepath) / pathlib.Path(f"{filename}.comments.json")
+            with open(path, "w") as f:
+                json.dump(self.getCommentMap(), f, indent=0)
+
+    def _compileGates(self, gates):
+        for gate in gates:
             if gate["type"] == "h":
                 self._h(gate["target"])
             elif gate["type"] == "cnot":
@@ -31,18 +65,26 @@ class FPGAQCCompiler():
                 self._t(gate["target"])
             else:
                 raise Exception("Method not found")
-        
-        if enableTimer:
-            self._stopTimer()
-        
-        self._serialTransmitStateVector()
-        self._halt()
-        string = ""
-        for i in range(len(self.program)):
-            string += f"{self.program[i]} --{self.comments[i]}\n"
-        path = pathlib.Path(filepath) / pathlib.Path(f"{filename}.prg")
-        with open(path, "w") as f:
-            f.write(string)
+
+    def _compileOpcodes(self, circuit):
+        gatesByType = {"h": lambda target, control1, control2: self._h(target),
+                       "cnot": lambda target, control1, control2: self._cnot(target, control1),
+                       "ccnot": lambda target, control1, control2: self._ccnot(target, control1, control2),
+                       "x": lambda target, control1, control2: self._x(target),
+                       "t": lambda target, control1, control2: self._t(target)}
+        gates = [gatesByType[gateType] for gateType in GATE_TYPES]
+        for opcode, target, control1, control2 in circuit:
+            gates[opcode](target, control1, control2)
+
+    def getProgramText(self):
+        return "".join(f"{self.program[i]} --{self.comments[i]}\n" for i in range(len(self.program)))
+
+    def getProgramBinary(self):
+        return bytes(int(instruction, 2) for instruction in self.program)
+
+    # program address -> comment
+    def getCommentMap(self):
+        return {str(i): self.comments[i] for i in range(len(self.comments))}
 
     def _x(self, target):
         self._applyGate("X", target)
@@ -57,6 +99,9 @@ class FPGAQCCompiler():
         self._applyGate("X", target, control)
 
     def _ccnot(self, target, control1, control2):
+        if self.multiControlSupport:
+            self._applyGate("X", target, control1, control2)
+            return
         self._applyGate("H", target, None)
         self._applyGate("X", target, control2)
         for _ in range(3):
@@ -194,8 +239,18 @@ class FPGAQCCompiler():
         self.program.append(instructionCode + parameterCode)
         self.comments.append(f"Set control qubit to {qubit}")
     
+    def _setSecondControlQubit(self, qubit):
+        self.secondControlQubit = qubit
+        self.GateAsSecondControl = True
+        instructionCode = "1111"
+        parameterCode = format(qubit, '04b')
+        self.program.append(instructionCode + parameterCode)
+        self.comments.append(f"Set second control qubit to {qubit}")
+
+    #deactivates both control qubits
     def _deactivateControlQubit(self):
         self.GateAsControl = False
+        self.GateAsSecondControl = False
         instructionCode = "1110"
         parameterCode = "0000"
         self.program.append(instructionCode + parameterCode)
@@ -221,13 +276,21 @@ class FPGAQCCompiler():
         elif not gate in ["H", "T", "X"]:
             raise ValueError("gate must be H, T, or X")
     
-    def _applyGate(self, gate="H", targetQubit=0, controlQubit=None):
+    def _applyGate(self, gate="H", targetQubit=0, controlQubit=None, secondControlQubit=None):
         self._checkGateInput(gate)
         self._checkQubitInput(targetQubit)
         if controlQubit != None:
             self._checkQubitInput(controlQubit)
             if controlQubit == targetQubit:
                 raise ValueError("Control qubit cannot be the same as target qubit")
+        if secondControlQubit != None:
+            if not self.multiControlSupport:
+                raise ValueError("Second control qubit requires multiControlSupport")
+            if controlQubit == None:
+                raise ValueError("Second control qubit requires a first control qubit")
+            self._checkQubitInput(secondControlQubit)
+            if secondControlQubit == targetQubit or secondControlQubit == controlQubit:
+                raise ValueError("Control qubits must be different from each other and from the target qubit")
 
         if not targetQubit == self.targetQubit:
             
@@ -237,9 +300,15 @@ class FPGAQCCompiler():
             
             self._setTargetMatrix(gate)
 
+        if secondControlQubit == None and self.GateAsSecondControl:
+            self._deactivateControlQubit()
+
         if controlQubit != None:
             if not controlQubit == self.controlQubit or not self.GateAsControl:
                 self._setControlQubit(controlQubit)
+            if secondControlQubit != None:
+                if not secondControlQubit == self.secondControlQubit or not self.GateAsSecondControl:
+                    self._setSecondControlQubit(secondControlQubit)
         else:
             if self.GateAsControl:
                 self._deactivateControlQubit()
@@ -0,0 +1,188 @@
+from QBridge.simulators import CustomQCSimulator, applyGate
+from QBridge.tools import readProgram, encodeStateVector, FRAME_LENGTH
+from QBridge.protocol import encodePacket, transferTime
+import numpy as np
+
+# Executes FPGA programs (.prg/.bin) in software. Registers, the program counter loop used for the
+# serial transmission, the timer and the state vector RAM are modelled after controlUnit.vhd, gates are
+# applied with the vectorized CustomQCSimulator kernel. Clock cycles are counted per instruction
+# with the cycle model below, so the timer value and the serial transfer time can be predicted.
+class FPGAEmulator():
+    # execute cycles of the control unit (100 MHz) per opcode, every instruction also needs 2 fetch cycles
+    fetchCycles = 2
+    executeCycles = {"0000": 1, "0001": 1, "0010": 1, "0011": 1, "0100": 7, "0111": 7, "1000": 1,
+                     "1001": 2, "1011": 1, "1100": 1, "1101": 1, "1110": 1, "1111": 1}
+    timerResetCycles = 3
+    # RAMController.vhd and the processing units run at 200 MHz: 4 initialization cycles, 8 cycles to
+    # hand one amplitude pair to a core and the latency of the last pair through core and write back
+    ramControllerInitCycles = 4
+    ramControllerCyclesPerPair = 8
+    ramControllerDrainCycles = 14
+    ramClockRatio = 2
+    # uartTransmitter.vhd: 12 frames per number, each frame takes 12 bit slots of ticks_per_bit+1 cycles
+    uartSlotsPerFrame = 12
+
+    # with simulate=False no gates are applied, only the registers and clock cycles are modelled
+    def __init__(self, clockFrequency=100000000, baudRate=460800, maxQubits=14, multiControlSupport=False, simulate=True):
+        self.clockFrequency = clockFrequency
+        self.simulate = simulate
+        self.baudRate = baudRate
+        self.maxQubits = maxQubits
+        self.multiControlSupport = multiControlSupport
+        self.program = b""
+        self.reset()
+
+    def reset(self):
+        self.ram = np.zeros(2**self.maxQubits, dtype=np.complex128)
+        self.ram[0] = 1
+        self.programCounter = 0
+        self.nQubits = 0
+        self.targetQubit = 0
+        self.targetMatrix = CustomQCSimulator.X
+        self.controlQubit = 0
+        self.applyControlGate = False
+        self.secondControlQubit = 0
+        self.applySecondControlGate = False
+        self.addressRegister = 0
+        self.timerRunning = False
+        self.timerCycles = 0
+        self.cycles = 0
+        self.halted = False
+        self.transmitted = []
+        self.instructionCounts = {}
+        self.cyclesPerOpcode = {}
+
+    def load(self, program):
+        self.program = bytes(program)
+        self.reset()
+
+    def loadFile(self, filepath, filename):
+        self.load(readProgram(filepath, filename))
+
+    def ticksPerBit(self):
+        return self.clockFrequency // self.baudRate
+
+    def transmitCycles(self):
+        return FRAME_LENGTH * self.uartSlotsPerFrame * (self.ticksPerBit() + 1)
+
+    def calculateCycles(self, nQubits):
+        ramCycles = self.ramControllerInitCycles + self.ramControllerCyclesPerPair * 2**(nQubits-1) + self.ramControllerDrainCycles
+        return -(-ramCycles // self.ramClockRatio)
+
+    # cycles of one instruction including fetch, with the current register contents
+    def instructionCycles(self, instruction):
+        opcode = format(instruction >> 4, '04b')
+        cycles = self.fetchCycles + self.executeCycles.get(opcode, 1)
+        if opcode == "0100":
+            cycles += self.calculateCycles(self.nQubits)
+        elif opcode == "0111":
+            cycles += self.transmitCycles()
+        elif opcode == "1100" and instruction & 0xF == 0:
+            cycles = self.fetchCycles + self.timerResetCycles
+        return cycles
+
+    def run(self, maxInstructions=10**8):
+        for _ in range(maxInstructions):
+            if self.halted:
+                break
+            self.step()
+        return self.report()
+
+    def step(self):
+        if self.programCounter >= len(self.program):
+            raise Exception(f"Program counter {self.programCounter} outside of the program")
+        instruction = self.program[self.programCounter]
+        opcode = format(instruction >> 4, '04b')
+        parameter = instruction & 0xF
+        cycles = self.instructionCycles(instruction)
+        self.programCounter += 1
+
+        if opcode == "0001":
+            self.nQubits = parameter
+        elif opcode == "0010":
+            self.targetQubit = parameter
+        elif opcode == "0011":
+            if parameter == 1:
+                self.targetMatrix = CustomQCSimulator.H
+            elif parameter == 2:
+                self.targetMatrix = CustomQCSimulator.T
+            else:
+                self.targetMatrix = CustomQCSimulator.X
+        elif opcode == "0100" and self.simulate:
+            self._calculateStateVector()
+        elif opcode == "0111":
+            self.transmitted.append(self.ram[self.addressRegister])
+            # the element is reset to |0...0> after it has been sent
+            if parameter == 0:
+                self.ram[self.addressRegister] = 1 if self.addressRegister == 0 else 0
+        elif opcode == "1000":
+            if parameter == 0:
+                self.addressRegister = 0
+            elif parameter == 2:
+                self.addressRegister += 1
+            elif parameter == 3:
+                self.addressRegister -= 1
+            else:
+                raise Exception(f"Address register action {parameter} stalls the control unit")
+        elif opcode == "1001":
+            if self.addressRegister < 2**self.nQubits:
+                self.programCounter -= parameter
+        elif opcode == "1011":
+            self.halted = True
+        elif opcode == "1100":
+            if parameter == 0:
+                self.timerCycles = 0
+            elif parameter == 1:
+                self.timerRunning = True
+            elif parameter == 2:
+                self.timerRunning = False
+        elif opcode == "1101":
+            self.controlQubit = parameter
+            self.applyControlGate = True
+        elif opcode == "1110":
+            self.applyControlGate = False
+            self.applySecondControlGate = False
+        elif opcode == "1111" and self.multiControlSupport:
+            self.secondControlQubit = parameter
+            self.applySecondControlGate = True
+
+        # the timer only counts while it runs, so start and stop are counted on their edge
+        if self.timerRunning and not (opcode == "1100" and parameter == 1):
+            self.timerCycles += cycles
+        self.cycles += cycles
+        self.instructionCounts[opcode] = self.instructionCounts.get(opcode, 0) + 1
+        self.cyclesPerOpcode[opcode] = self.cyclesPerOpcode.get(opcode, 0) + cycles
+
+    def _calculateStateVector(self):
+        controls = []
+        if self.applyControlGate:
+            controls.append(self.controlQubit)
+            if self.applySecondControlGate:
+                controls.append(self.secondControlQubit)
+        applyGate(self.ram[:2**self.nQubits], self.nQubits, self.targetMatrix, self.targetQubit, controls)
+
+    # the bytes the UART would have sent so far, with packetMode ("dense", "runLength", "sparse" or
+    # "auto") the transmitted state vector is encoded as a packet of QBridge/protocol.py instead
+    def serialOutput(self, packetMode=None):
+        if packetMode == None:
+            return encodeStateVector(np.array(self.transmitted, dtype=np.complex128))
+        return encodePacket(np.array(self.transmitted, dtype=np.complex128), packetMode)
+
+    def report(self):
+        transmitCycles = self.cyclesPerOpcode.get("0111", 0)
+        # what the same state vector would cost as the smallest packet
+        packetBytes = None
+        if len(self.transmitted) > 0 and len(self.transmitted) & (len(self.transmitted)-1) == 0:
+            packetBytes = len(self.serialOutput("auto"))
+        return {"cycles": self.cycles,
+                "runtime": self.cycles / self.clockFrequency,
+                "timerCycles": self.timerCycles,
+                "timerHex": format(self.timerCycles % 2**16, '04X'),
+                "timerOverflows": self.timerCycles // 2**16,
+                "timerRuntime": self.timerCycles / self.clockFrequency,
+                "serialBytes": len(self.transmitted) * FRAME_LENGTH,
+                "serialTransferTime": transmitCycles / self.clockFrequency,
+                "packetBytes": packetBytes,
+                "packetTransferTime": transferTime(packetBytes, self.baudRate) if packetBytes != None else None,
+                "instructionCounts": dict(self.instructionCounts),
+                "cyclesPerOpcode": dict(self.cyclesPerOpcode)}
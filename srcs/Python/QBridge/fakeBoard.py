@@ -0,0 +1,64 @@
+from QBridge.emulator import FPGAEmulator
+import os
+import pty
+import tty
+import time
+import threading
+
+# Stand-in for a Basys3 board on a pseudo terminal, serial.Serial(board.portName) talks to it like to
+# the real device. send() paces the data like uartTransmitter.vhd, which needs 12 bit times per byte.
+# After serve() the board also receives programs framed by 0xFF like uploadProgram sends them, runs
+# them on an FPGAEmulator and sends the state vector back.
+class FakeBoard():
+    bitsPerByte = 12
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.portName = os.ttyname(self.slave)
+        self.programsRun = 0
+        self.lastReport = None
+        self.serveThread = None
+
+    def send(self, data, baudRate=460800, chunkSize=256):
+        bytesPerSecond = baudRate / self.bitsPerByte
+        startTime = time.time()
+        for i in range(0, len(data), chunkSize):
+            os.write(self.master, data[i:i+chunkSize])
+            delay = startTime + (i + chunkSize) / bytesPerSecond - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    # packetMode is passed to FPGAEmulator.serialOutput, None sends the framed stream of the real board
+    def serve(self, baudRate=460800, packetMode=None, maxQubits=14):
+        self.serveThread = threading.Thread(target=self._serveLoop, args=(baudRate, packetMode, maxQubits), daemon=True)
+        self.serveThread.start()
+
+    def _serveLoop(self, baudRate, packetMode, maxQubits):
+        emulator = FPGAEmulator(baudRate=baudRate, maxQubits=maxQubits)
+        buffer = b""
+        while True:
+            try:
+                buffer += os.read(self.master, 4096)
+            except OSError:
+                return # closed
+
+            start = buffer.find(b"\xFF")
+            end = buffer.find(b"\xFF", start+1)
+            if start < 0 or end < 0:
+                continue
+            program = buffer[start+1:end]
+            buffer = buffer[end+1:]
+
+            emulator.load(program)
+            self.lastReport = emulator.run()
+            self.programsRun += 1
+            try:
+                self.send(emulator.serialOutput(packetMode), baudRate)
+            except OSError:
+                return
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
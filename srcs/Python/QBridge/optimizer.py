@@ -0,0 +1,205 @@
+from QBridge.quantumCircuit import QuantumCircuit
+from QBridge.simulators import CustomQCSimulator
+from QBridge.emulator import FPGAEmulator
+import numpy as np
+
+selfInverseGates = ["h", "x", "cnot", "ccnot"]
+matrices = {"h": CustomQCSimulator.H, "x": CustomQCSimulator.X, "t": CustomQCSimulator.T}
+
+# number of full state vector sweeps a gate costs, ccnot is decomposed into 18 gates
+# unless the backend has a native multi controlled kernel
+def countSweeps(circuit, nativeCcnot=False):
+    sweeps = 0
+    for gate in circuit.circuit:
+        if gate["type"] == "ccnot" and not nativeCcnot:
+            sweeps += 18
+        else:
+            sweeps += 1
+    return sweeps
+
+def _qubitsOf(gate):
+    return [q for q in [gate["target"], gate["control1"], gate["control2"]] if q != None]
+
+def _matrixOf(gate):
+    if gate["type"] == "u":
+        return np.asarray(gate["matrix"])
+    return matrices[gate["type"]]
+
+# Removes adjacent inverse pairs (X.X, H.H, CNOT.CNOT, CCNOT.CCNOT, 8 T gates) and, if
+# allowMatrixGates is True, fuses consecutive single qubit gates on the same qubit into one "u"
+# gate. Gates only count as adjacent if every gate between them acts on disjoint qubits, i.e.
+# gates are commuted past each other whenever that is allowed.
+# The FPGA only knows H, T and X, so circuits meant for FPGAQCCompiler have to be optimized with
+# allowMatrixGates=False.
+def optimizeCircuit(circuit, allowMatrixGates=False, nativeCcnot=False):
+    gates = []
+    # for every qubit the indices in gates of the gates acting on it, in circuit order
+    history = [[] for _ in range(circuit.nQubits)]
+
+    for gate in circuit.circuit:
+        qubits = _qubitsOf(gate)
+        previous = [history[q][-1] if len(history[q]) > 0 else None for q in qubits]
+        last = previous[0] if len(set(previous)) == 1 else None
+
+        if last != None:
+            lastGate = gates[last]
+            singleQubit = gate["control1"] == None and lastGate["control1"] == None
+
+            if gate["type"] in selfInverseGates and lastGate["type"] == gate["type"] and \
+                    lastGate["target"] == gate["target"] and set(_qubitsOf(lastGate)) == set(qubits):
+                gates[last] = None
+                for q in qubits:
+                    history[q].pop()
+                continue
+
+            if singleQubit and allowMatrixGates:
+                matrix = _matrixOf(gate) @ _matrixOf(lastGate)
+                if np.allclose(matrix, np.eye(2)):
+                    gates[last] = None
+                    history[qubits[0]].pop()
+                else:
+                    gates[last] = {"type": "u", "target": gate["target"], "control1": None, "control2": None, "matrix": matrix}
+                continue
+
+            # T^8 is the identity
+            if gate["type"] == "t" and len(history[qubits[0]]) >= 7 and \
+                    all(gates[i]["type"] == "t" for i in history[qubits[0]][-7:]):
+                for _ in range(7):
+                    gates[history[qubits[0]].pop()] = None
+                continue
+
+        gates.append(gate)
+        for q in qubits:
+            history[q].append(len(gates)-1)
+
+    optimizedCircuit = QuantumCircuit(circuit.nQubits)
+    optimizedCircuit.circuit = [gate for gate in gates if gate != None]
+
+    sweepsBefore = countSweeps(circuit, nativeCcnot)
+    sweepsAfter = countSweeps(optimizedCircuit, nativeCcnot)
+    report = {"gatesBefore": len(circuit.circuit), "gatesAfter": len(optimizedCircuit.circuit),
+              "sweepsBefore": sweepsBefore, "sweepsAfter": sweepsAfter, "sweepsRemoved": sweepsBefore - sweepsAfter}
+    return optimizedCircuit, report
+
+# cycles of every instruction (fetch + execute) from the cycle model of FPGAEmulator, measured timer
+# values per opcode can be passed to scheduleCircuit instead
+def emulatorCostModel():
+    return {opcode: FPGAEmulator.fetchCycles + cycles for opcode, cycles in FPGAEmulator.executeCycles.items()}
+
+# same decomposition as FPGAQCCompiler._ccnot, as circuit gates
+def decomposeCcnot(target, control1, control2):
+    def gate(gateType, target, control1=None):
+        return {"type": gateType, "target": target, "control1": control1, "control2": None}
+    return [gate("h", target), gate("cnot", target, control2)] + [gate("t", target)]*3 + \
+           [gate("cnot", target, control1), gate("t", target), gate("cnot", target, control2)] + [gate("t", target)]*3 + \
+           [gate("cnot", target, control1), gate("t", target), gate("t", control2), gate("h", target),
+            gate("cnot", control2, control1), gate("t", control1)] + [gate("t", control2)]*3 + [gate("cnot", control2, control1)]
+
+# what a gate does to each of its qubits: controls and T are diagonal, X targets flip and H targets mix.
+# Two gates commute if they commute on every qubit they share, which is the case for two diagonal
+# roles and for two flip roles
+def _roles(gate):
+    roles = {gate["target"]: {"h": "H", "x": "flip", "cnot": "flip", "ccnot": "flip", "t": "diagonal"}[gate["type"]]}
+    for control in [gate["control1"], gate["control2"]]:
+        if control != None:
+            roles[control] = "diagonal"
+    return roles
+
+# register switch instructions FPGAQCCompiler._applyGate emits for a gate, and the registers after it
+def _switchInstructions(registers, gate):
+    target, matrix, control, controlActive, secondControl, secondControlActive = registers
+    gateMatrix = {"h": "H", "t": "T", "x": "X", "cnot": "X", "ccnot": "X"}[gate["type"]]
+    instructions = []
+    if gate["target"] != target:
+        instructions.append("0010")
+    if gateMatrix != matrix:
+        instructions.append("0011")
+    if gate["control2"] == None and secondControlActive:
+        instructions.append("1110")
+        controlActive = secondControlActive = False
+    if gate["control1"] != None:
+        if gate["control1"] != control or not controlActive:
+            instructions.append("1101")
+        if gate["control2"] != None and (gate["control2"] != secondControl or not secondControlActive):
+            instructions.append("1111")
+        control, controlActive = gate["control1"], True
+        if gate["control2"] != None:
+            secondControl, secondControlActive = gate["control2"], True
+    elif controlActive:
+        instructions.append("1110")
+        controlActive = secondControlActive = False
+    return instructions, (gate["target"], gateMatrix, control, controlActive, secondControl, secondControlActive)
+
+def _switchCost(circuitGates, costModel):
+    registers = (None, None, None, False, None, False)
+    instructions = 0
+    cycles = 0
+    for gate in circuitGates:
+        emitted, registers = _switchInstructions(registers, gate)
+        instructions += len(emitted)
+        cycles += sum(costModel[opcode] for opcode in emitted)
+    return instructions, cycles
+
+# Reorders commuting gates so that FPGAQCCompiler emits as few register switches (set target, set
+# matrix, set/deactivate control) as possible. ccnot is first expanded into the compiler's
+# decomposition unless nativeCcnot is True, so its gates can be interleaved with the rest. Gates are
+# scheduled greedily: out of the gates whose non commuting predecessors are all scheduled the one
+# with the cheapest switches under costModel (opcode -> cycles) is taken, ties go to circuit order.
+# The result is the same unitary, state vectors agree up to floating point rounding.
+def scheduleCircuit(circuit, nativeCcnot=False, costModel=None):
+    if costModel == None:
+        costModel = emulatorCostModel()
+    gates = []
+    for gate in circuit.circuit:
+        if gate["type"] == "u":
+            raise ValueError("matrix gates can not be compiled for the FPGA")
+        if gate["type"] == "ccnot" and not nativeCcnot:
+            gates.extend(decomposeCcnot(gate["target"], gate["control1"], gate["control2"]))
+        else:
+            gates.append(gate)
+
+    # dependencies: on every qubit the gates form groups of the same commuting role, a gate depends
+    # on the whole previous group
+    predecessors = [0] * len(gates)
+    successors = [[] for _ in gates]
+    groups = [(None, [], []) for _ in range(circuit.nQubits)] # (role, current group, previous group)
+    for index, gate in enumerate(gates):
+        dependencies = set()
+        for qubit, role in _roles(gate).items():
+            groupRole, current, previous = groups[qubit]
+            if role == groupRole and role != "H":
+                dependencies.update(previous)
+                current.append(index)
+            else:
+                dependencies.update(current)
+                groups[qubit] = (role, [index], current)
+        for dependency in dependencies:
+            successors[dependency].append(index)
+        predecessors[index] = len(dependencies)
+
+    ready = [index for index in range(len(gates)) if predecessors[index] == 0]
+    registers = (None, None, None, False, None, False)
+    scheduled = []
+    while len(ready) > 0:
+        best = None
+        for index in ready:
+            emitted, nextRegisters = _switchInstructions(registers, gates[index])
+            cost = (sum(costModel[opcode] for opcode in emitted), index)
+            if best == None or cost < best[0]:
+                best = (cost, index, nextRegisters)
+        _, index, registers = best
+        ready.remove(index)
+        scheduled.append(gates[index])
+        for successor in successors[index]:
+            predecessors[successor] -= 1
+            if predecessors[successor] == 0:
+                ready.append(successor)
+
+    scheduledCircuit = QuantumCircuit(circuit.nQubits)
+    scheduledCircuit.circuit = scheduled
+
+    instructionsBefore, cyclesBefore = _switchCost(gates, costModel)
+    instructionsAfter, cyclesAfter = _switchCost(scheduled, costModel)
+    report = {"gates": len(scheduled), "switchInstructionsBefore": instructionsBefore, "switchInstructionsAfter": instructionsAfter,
+              "switchCyclesBefore": cyclesBefore, "switchCyclesAfter": cyclesAfter}
+    return scheduledCircuit, report
@@ -0,0 +1,155 @@
+import numpy as np
+import struct
+import zlib
+
+# Packed state vector packets as an alternative to the 12 byte per number framing of uartTransmitter.vhd.
+# Every packet is
+#   header:   sync byte 0xA5, mode, nQubits, entry count (uint32), payload length (uint32), header check byte
+#   payload:  depends on the mode, numbers are int32 real/imaginary pairs with FRACTIONAL_BITS fractional bits
+#   checksum: crc32 of header and payload (uint32)
+# all little endian. The sync byte can never start a legacy transmission, which always starts with 0x01.
+# The header check byte (lowest byte of the crc32 of the rest of the header) lets the decoder skip a
+# packet with a damaged payload as a whole and rejects most sync bytes found inside of payloads.
+SYNC_BYTE = 0xA5
+FRACTIONAL_BITS = 30
+MAX_QUBITS = 16 # the address calculation of the FPGA is 16 bits wide
+HEADER = struct.Struct("<BBBIIB")
+CHECKSUM = struct.Struct("<I")
+
+MODE_DENSE = 0 # all 2^nQubits numbers
+MODE_RUN_LENGTH = 1 # segments of (zero run length, number of literals) followed by all literals
+MODE_SPARSE = 2 # only the nonzero numbers as uint32 indices followed by their values
+MODES = {"dense": MODE_DENSE, "runLength": MODE_RUN_LENGTH, "sparse": MODE_SPARSE}
+
+numberDtype = np.dtype([("real", "<i4"), ("imag", "<i4")])
+segmentDtype = np.dtype([("zeros", "<u4"), ("literals", "<u4")])
+
+# complex values -> structured int32 array, values are truncated like the FPGA does
+def toFixedPoint(stateVector):
+    stateVector = np.asarray(stateVector, dtype=np.complex128).ravel()
+    limit = 2**31
+    numbers = np.empty(len(stateVector), dtype=numberDtype)
+    numbers["real"] = np.clip(np.floor(stateVector.real * 2**FRACTIONAL_BITS), -limit, limit-1)
+    numbers["imag"] = np.clip(np.floor(stateVector.imag * 2**FRACTIONAL_BITS), -limit, limit-1)
+    return numbers
+
+def fromFixedPoint(numbers):
+    stateVector = np.empty(len(numbers), dtype=np.complex128)
+    stateVector.real = numbers["real"] / 2**FRACTIONAL_BITS
+    stateVector.imag = numbers["imag"] / 2**FRACTIONAL_BITS
+    return stateVector
+
+def _denseBody(numbers):
+    return len(numbers), numbers.tobytes()
+
+def _sparseBody(numbers):
+    indices = np.flatnonzero((numbers["real"] != 0) | (numbers["imag"] != 0))
+    return len(indices), indices.astype("<u4").tobytes() + numbers[indices].tobytes()
+
+def _runLengthBody(numbers):
+    nonzero = ((numbers["real"] != 0) | (numbers["imag"] != 0)).astype(np.int8)
+    edges = np.diff(np.concatenate([[0], nonzero, [0]]))
+    runStarts = np.flatnonzero(edges == 1)
+    runEnds = np.flatnonzero(edges == -1)
+    segments = np.zeros(len(runStarts) + 1, dtype=segmentDtype)
+    segments["zeros"][:-1] = runStarts - np.concatenate([[0], runEnds[:-1]])
+    segments["literals"][:-1] = runEnds - runStarts
+    segments["zeros"][-1] = len(numbers) - (runEnds[-1] if len(runEnds) > 0 else 0)
+    return len(segments), segments.tobytes() + numbers[nonzero == 1].tobytes()
+
+bodyEncoders = {MODE_DENSE: _denseBody, MODE_SPARSE: _sparseBody, MODE_RUN_LENGTH: _runLengthBody}
+
+# mode is "dense", "runLength", "sparse" or "auto" for the smallest of them
+def encodePacket(stateVector, mode="auto"):
+    numbers = toFixedPoint(stateVector)
+    nQubits = int(np.log2(len(numbers)))
+    if len(numbers) != 2**nQubits:
+        raise ValueError("state vector length must be a power of two")
+
+    if mode == "auto":
+        bodies = [(modeId, bodyEncoders[modeId](numbers)) for modeId in bodyEncoders]
+        modeId, (count, payload) = min(bodies, key=lambda body: len(body[1][1]))
+    else:
+        modeId = MODES[mode]
+        count, payload = bodyEncoders[modeId](numbers)
+
+    header = HEADER.pack(SYNC_BYTE, modeId, nQubits, count, len(payload), 0)[:-1]
+    header += bytes([zlib.crc32(header) & 0xFF])
+    return header + payload + CHECKSUM.pack(zlib.crc32(header + payload))
+
+def _decodeBody(modeId, nQubits, count, payload):
+    if modeId == MODE_DENSE:
+        return np.frombuffer(payload, dtype=numberDtype, count=count)
+    numbers = np.zeros(2**nQubits, dtype=numberDtype)
+    if modeId == MODE_SPARSE:
+        indices = np.frombuffer(payload, dtype="<u4", count=count)
+        numbers[indices] = np.frombuffer(payload, dtype=numberDtype, count=count, offset=4*count)
+    elif modeId == MODE_RUN_LENGTH:
+        segments = np.frombuffer(payload, dtype=segmentDtype, count=count)
+        literals = np.frombuffer(payload, dtype=numberDtype, offset=segments.nbytes)
+        # the literals of segment i start after all zeros of the segments 0..i
+        positions = np.repeat(np.cumsum(segments["zeros"].astype(np.int64)), segments["literals"])
+        numbers[positions + np.arange(len(literals))] = literals
+    else:
+        raise ValueError(f"Unknown packet mode {modeId}")
+    return numbers
+
+# Streaming decoder for packets, feed() returns the state vectors of all packets completed by the chunk.
+# Packets with a wrong checksum are dropped and counted, bytes before a sync byte are skipped. Headers
+# with more than maxQubits qubits or an unknown mode are taken as noise, so a false sync byte never
+# makes the decoder wait for more than one packet of maxQubits qubits.
+class PacketDecoder():
+    def __init__(self, maxQubits=MAX_QUBITS):
+        self.maxQubits = maxQubits
+        self.buffer = b""
+        self.checksumErrors = 0
+        self.skippedBytes = 0
+        self.nDecoded = 0
+
+    def reset(self):
+        self.__init__(self.maxQubits)
+
+    def feed(self, chunk):
+        self.buffer += bytes(chunk)
+        stateVectors = []
+        while True:
+            start = self.buffer.find(bytes([SYNC_BYTE]))
+            if start < 0:
+                self.skippedBytes += len(self.buffer)
+                self.buffer = b""
+                break
+            self.skippedBytes += start
+            self.buffer = self.buffer[start:]
+            if len(self.buffer) < HEADER.size:
+                break
+            _, modeId, nQubits, count, payloadLength, headerCheck = HEADER.unpack_from(self.buffer)
+            # a sync byte inside of noise or a payload, don't wait for a payload that will never come
+            if (headerCheck != zlib.crc32(self.buffer[:HEADER.size-1]) & 0xFF or not modeId in MODES.values()
+                    or nQubits > self.maxQubits or count > 2**nQubits or payloadLength > 16 * 2**nQubits + 16):
+                self.skippedBytes += 1
+                self.buffer = self.buffer[1:]
+                continue
+            packetLength = HEADER.size + payloadLength + CHECKSUM.size
+            if len(self.buffer) < packetLength:
+                break
+            packet = self.buffer[:packetLength]
+            (checksum,) = CHECKSUM.unpack_from(packet, HEADER.size + payloadLength)
+            if checksum != zlib.crc32(packet[:HEADER.size + payloadLength]):
+                self.checksumErrors += 1
+                self.buffer = self.buffer[packetLength:]
+                continue
+            numbers = _decodeBody(modeId, nQubits, count, packet[HEADER.size:HEADER.size + payloadLength])
+            stateVectors.append(fromFixedPoint(numbers))
+            self.nDecoded += 1
+            self.buffer = self.buffer[packetLength:]
+        return stateVectors
+
+def decodePacket(data):
+    stateVectors = PacketDecoder().feed(data)
+    if len(stateVectors) == 0:
+        raise ValueError("No valid packet found")
+    return stateVectors[0]
+
+# seconds needed to send nBytes over a UART with 1 start and 1 stop bit per byte
+def transferTime(nBytes, baudRate=460800, bitsPerByte=10):
+    return nBytes * bitsPerByte / baudRate
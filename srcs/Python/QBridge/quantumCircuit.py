@@ -1,5 +1,6 @@
 import random
 import webbrowser
+import numpy as np
 
 class QuantumCircuit():
 
@@ -26,21 +27,34 @@ class QuantumCircuit():
     def t(self, target):
         gate = {"type": "t", "target": target, "control1": None, "control2": None}
         self.circuit.append(gate)
+
+    # arbitrary single qubit gate, only supported by the simulators
+    def u(self, target, matrix):
+        gate = {"type": "u", "target": target, "control1": None, "control2": None, "matrix": matrix}
+        self.circuit.append(gate)
     
     def visualise(self):
         quirkTranslations = {"h": "H", "cnot": "X", "x": "X", "t": "T", "ccnot": "X", "t": "Z^¼"}
         quirkLink = 'https://algassert.com/quirk#circuit={%22cols%22:['
         doubleQuotes = '%22'
+        customGates = [] # Quirk definitions of the "u" gates, they are placed as ~u<index>
         for i in range(len(self.circuit)):
             gate = self.circuit[i]["type"]
             target = self.circuit[i]["target"]
             control1 = self.circuit[i]["control1"]
             control2 = self.circuit[i]["control2"]
+            if gate == "u":
+                quirkGate = f"~u{len(customGates)}"
+                customGates.append(self._quirkMatrixGate(quirkGate, self.circuit[i]["matrix"]))
+            elif gate in quirkTranslations:
+                quirkGate = quirkTranslations[gate]
+            else:
+                raise ValueError(f"Quirk has no translation for {gate} gates")
             quirkColumn = "["
             for j in range(self.nQubits):
                 if j == target:
                     quirkColumn += doubleQuotes
-                    quirkColumn += quirkTranslations[gate]
+                    quirkColumn += quirkGate
                     quirkColumn += doubleQuotes
 
                 elif j == control1 or j == control2:
@@ -56,9 +70,20 @@ class QuantumCircuit():
             if i < len(self.circuit)-1:
                 quirkLink += ","
         
-        quirkLink += "]}"
+        quirkLink += "]"
+        if len(customGates) > 0:
+            quirkLink += ',%22gates%22:[' + ",".join(customGates) + "]"
+        quirkLink += "}"
         webbrowser.open(quirkLink)
 
+    # custom 2x2 matrix gate of Quirk, e.g. {"id":"~u0","name":"U","matrix":"{{1,0},{0,0.7071+0.7071i}}"}
+    def _quirkMatrixGate(self, quirkGate, matrix):
+        def number(value):
+            value = complex(value)
+            return f"{value.real:.6g}{value.imag:+.6g}i"
+        rows = ["{" + ",".join(number(value) for value in row) + "}" for row in np.asarray(matrix)]
+        return '{%22id%22:%22' + quirkGate + '%22,%22name%22:%22U%22,%22matrix%22:%22{' + ",".join(rows) + '}%22}'
+
 
         
     
@@ -81,4 +106,113 @@ class QuantumCircuit():
                 raise Exception("Method not found")
 
     def reset(self):
-        self.__init__(self.nQubits)
\ No newline at end of file
+        self.__init__(self.nQubits)
+
+# opcode of every gate type in ArrayQuantumCircuit, unused controls are stored as -1
+GATE_TYPES = ["h", "cnot", "ccnot", "x", "t"]
+OPCODES = {gateType: opcode for opcode, gateType in enumerate(GATE_TYPES)}
+
+# Same interface as QuantumCircuit, but the gates are stored in a structured numpy array instead of
+# one dict per gate. Iterating yields (opcode, target, control1, control2) tuples of ints.
+class ArrayQuantumCircuit():
+    gateDtype = np.dtype([("opcode", np.int8), ("target", np.int8), ("control1", np.int8), ("control2", np.int8)])
+
+    def __init__(self, nQubits, capacity=1024):
+        self.nQubits = nQubits
+        self.gates = np.empty(capacity, dtype=self.gateDtype)
+        self.nGates = 0
+
+    @classmethod
+    def fromCircuit(cls, circuit):
+        for gate in circuit.circuit:
+            if not gate["type"] in OPCODES:
+                raise ValueError(f"ArrayQuantumCircuit has no opcode for {gate['type']} gates (only {', '.join(GATE_TYPES)})")
+        arrayCircuit = cls(circuit.nQubits, capacity=max(len(circuit.circuit), 1))
+        arrayCircuit.extend([OPCODES[gate["type"]] for gate in circuit.circuit],
+                            [gate["target"] for gate in circuit.circuit],
+                            [-1 if gate["control1"] == None else gate["control1"] for gate in circuit.circuit],
+                            [-1 if gate["control2"] == None else gate["control2"] for gate in circuit.circuit])
+        return arrayCircuit
+
+    # list of gate dicts like QuantumCircuit.circuit, for code that does not know the array form
+    @property
+    def circuit(self):
+        return [{"type": GATE_TYPES[opcode], "target": target,
+                 "control1": None if control1 < 0 else control1,
+                 "control2": None if control2 < 0 else control2} for opcode, target, control1, control2 in self]
+
+    def _reserve(self, nGates):
+        if self.nGates + nGates > len(self.gates):
+            gates = np.empty(max(2*len(self.gates), self.nGates + nGates), dtype=self.gateDtype)
+            gates[:self.nGates] = self.gates[:self.nGates]
+            self.gates = gates
+
+    def append(self, opcode, target, control1=-1, control2=-1):
+        self._reserve(1)
+        self.gates[self.nGates] = (opcode, target, control1, control2)
+        self.nGates += 1
+
+    # appends many gates at once, the arguments are sequences of equal length
+    def extend(self, opcodes, targets, control1=None, control2=None):
+        opcodes = np.asarray(opcodes)
+        n = len(opcodes)
+        self._reserve(n)
+        gates = self.gates[self.nGates:self.nGates+n]
+        gates["opcode"] = opcodes
+        gates["target"] = targets
+        gates["control1"] = -1 if control1 is None else control1
+        gates["control2"] = -1 if control2 is None else control2
+        self.nGates += n
+
+    def h(self, target):
+        self.append(OPCODES["h"], target)
+
+    def cnot(self, target, control):
+        self.append(OPCODES["cnot"], target, control)
+
+    def ccnot(self, target, control1, control2):
+        self.append(OPCODES["ccnot"], target, control1, control2)
+
+    def x(self, target):
+        self.append(OPCODES["x"], target)
+
+    def t(self, target):
+        self.append(OPCODES["t"], target)
+
+    def __len__(self):
+        return self.nGates
+
+    def __iter__(self):
+        gates = self.gates[:self.nGates]
+        return zip(gates["opcode"].tolist(), gates["target"].tolist(), gates["control1"].tolist(), gates["control2"].tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            arrayCircuit = ArrayQuantumCircuit(self.nQubits, capacity=0)
+            arrayCircuit.gates = self.gates[:self.nGates][index].copy()
+            arrayCircuit.nGates = len(arrayCircuit.gates)
+            return arrayCircuit
+        return tuple(self.gates[:self.nGates][index].tolist())
+
+    def visualise(self):
+        circuit = QuantumCircuit(self.nQubits)
+        circuit.circuit = self.circuit
+        circuit.visualise()
+
+    def createRandomCircuit(self, nGates, possibleGates=["h", "cnot", "x", "t", "ccnot"]):
+        nControls = np.array([0, 1, 2, 0, 0])
+        for gate in possibleGates:
+            if nControls[OPCODES[gate]] + 1 > self.nQubits:
+                raise ValueError(f"{gate} needs {nControls[OPCODES[gate]] + 1} qubits, the circuit has {self.nQubits}")
+        opcodes = np.array([OPCODES[gate] for gate in possibleGates])[np.random.randint(len(possibleGates), size=nGates)]
+        # distinct qubits per gate, the unused controls are masked out below
+        qubits = np.argsort(np.random.rand(nGates, self.nQubits), axis=1)[:, :3]
+        if self.nQubits < 3:
+            qubits = np.pad(qubits, ((0, 0), (0, 3-self.nQubits)), constant_values=-1)
+        nControls = nControls[opcodes]
+        control1 = np.where(nControls >= 1, qubits[:, 1], -1)
+        control2 = np.where(nControls >= 2, qubits[:, 2], -1)
+        self.extend(opcodes, qubits[:, 0], control1, control2)
+
+    def reset(self):
+        self.__init__(self.nQubits)
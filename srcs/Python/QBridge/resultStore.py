@@ -0,0 +1,82 @@
+from QBridge.protocol import toFixedPoint, fromFixedPoint, numberDtype
+from QBridge.verification import verifyStateVectors
+import numpy as np
+import json
+import os
+import pathlib
+import time
+import uuid
+
+# Archive of state vectors. Every run is a .npy file that is opened as a memory map, either complex128
+# or the raw int32 fixed point numbers of the FPGA (fixedPoint=True). index.jsonl holds one line of
+# metadata per run, so runs can be selected without touching the vectors:
+#   store.query(nQubits=14, backend="FPGA", workload="grover", board="COM3")
+# Every entry has runId, circuitHash, backend, nQubits, timerCycles, wallTime, format and time, further
+# keyword arguments of add() are stored as tags.
+class ResultStore():
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.indexPath = self.directory / pathlib.Path("index.jsonl")
+        self.entries = {}
+        if self.indexPath.exists():
+            for line in self.indexPath.read_text().splitlines():
+                if line.strip() != "":
+                    entry = json.loads(line)
+                    self.entries[entry["runId"]] = entry
+
+    def _path(self, runId):
+        return self.directory / pathlib.Path(f"{runId}.npy")
+
+    def add(self, stateVector, circuitHash=None, backend="custom", timerCycles=None, wallTime=None, fixedPoint=False, **tags):
+        runId = uuid.uuid4().hex
+        if fixedPoint:
+            data = stateVector if np.asarray(stateVector).dtype == numberDtype else toFixedPoint(stateVector)
+        else:
+            data = np.asarray(stateVector, dtype=np.complex128).reshape(-1)
+
+        temporaryPath = self.directory / pathlib.Path(f"{runId}.tmp.npy")
+        output = np.lib.format.open_memmap(temporaryPath, mode="w+", dtype=data.dtype, shape=data.shape)
+        output[:] = data
+        output.flush()
+        del output
+        os.replace(temporaryPath, self._path(runId))
+
+        entry = {"runId": runId, "circuitHash": circuitHash, "backend": backend, "nQubits": int(np.log2(len(data))),
+                 "timerCycles": timerCycles, "wallTime": wallTime, "format": "fixedPoint" if fixedPoint else "complex128",
+                 "time": time.time()}
+        entry.update(tags)
+        with open(self.indexPath, "a") as index:
+            index.write(json.dumps(entry) + "\n")
+        self.entries[runId] = entry
+        return runId
+
+    # entries whose fields equal the given values, a callable value is used as a predicate
+    def query(self, **filters):
+        matches = []
+        for entry in self.entries.values():
+            if all((value(entry.get(key)) if callable(value) else entry.get(key) == value) for key, value in filters.items()):
+                matches.append(entry)
+        return sorted(matches, key=lambda entry: entry["time"])
+
+    # read only memory map of the stored array, structured int32 numbers for fixed point runs
+    def load(self, runId):
+        return np.load(self._path(runId), mmap_mode="r")
+
+    # complex128 chunks of at most chunkSize numbers, only one chunk is in memory at a time
+    def iterChunks(self, runId, chunkSize=2**16):
+        data = self.load(runId)
+        for start in range(0, len(data), chunkSize):
+            chunk = data[start:start+chunkSize]
+            yield fromFixedPoint(chunk) if chunk.dtype == numberDtype else np.asarray(chunk)
+
+    # streams both runs chunk by chunk through verifyStateVectors, runIdB is the reference
+    def compare(self, runIdA, runIdB, tolerance=1e-6, stopOnViolation=False, chunkSize=2**16):
+        return verifyStateVectors(self.load(runIdA), self.load(runIdB), tolerance, stopOnViolation, chunkSize)
+
+    def remove(self, runId):
+        self._path(runId).unlink()
+        del self.entries[runId]
+        temporaryPath = self.directory / pathlib.Path("index.jsonl.tmp")
+        temporaryPath.write_text("".join(json.dumps(entry) + "\n" for entry in self.entries.values()))
+        os.replace(temporaryPath, self.indexPath)
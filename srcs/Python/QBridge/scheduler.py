@@ -0,0 +1,130 @@
+from QBridge.emulator import FPGAEmulator
+from QBridge.tools import readProgram
+import queue
+import threading
+import time
+import serial
+
+# Shards compiled programs across several boards. Every BoardConnection gets a worker thread that takes
+# the next program from a shared job queue as soon as its board is idle, uploads it with uploadProgram
+# and waits for the state vector. A job that fails with a SerialException or times out is put back
+# into the queue and retried on any board up to maxRetries times, a board that cannot be reconnected
+# is retired. The boards show the timer only on their display, so the timer value of every job is
+# predicted with the cycle model of FPGAEmulator. While run() is busy every connection puts its results
+# onto a queue of its own, connections from connectAll share one queue and a worker would otherwise
+# take the state vector of another board.
+class BoardScheduler():
+    def __init__(self, connections, maxRetries=2, jobTimeout=60, predictTimer=True):
+        self.connections = connections
+        self.maxRetries = maxRetries
+        self.jobTimeout = jobTimeout
+        self.predictTimer = predictTimer
+        self.boardStats = {connection.name: {"jobs": 0, "failures": 0, "busyTime": 0, "retired": False} for connection in connections}
+
+    # programs is a list of (filepath, filename) of compiled programs, returns the results in the same order as
+    #   {"index", "board", "stateVector", "timerCycles", "timerRuntime", "runtime", "attempts", "report"}
+    # jobs that failed maxRetries+1 times have "error" instead of "stateVector"
+    def run(self, programs):
+        self.jobs = queue.Queue()
+        for index, (filepath, filename) in enumerate(programs):
+            self.jobs.put({"index": index, "filepath": filepath, "filename": filename, "attempts": 0})
+        self.pending = len(programs)
+        self.results = [None] * len(programs)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if self.pending == 0:
+            self.done.set()
+
+        sharedQueues = [connection.results for connection in self.connections]
+        for connection in self.connections:
+            connection.results = queue.Queue()
+        self.startTime = time.time()
+        workers = [threading.Thread(target=self._worker, args=(connection,), daemon=True) for connection in self.connections]
+        try:
+            for worker in workers:
+                worker.start()
+            # returns early if every board was retired
+            while not self.done.wait(0.5):
+                if not any(worker.is_alive() for worker in workers):
+                    break
+        finally:
+            self.endTime = time.time()
+            for connection, results in zip(self.connections, sharedQueues):
+                connection.results = results
+        return self.results
+
+    def _worker(self, connection):
+        stats = self.boardStats[connection.name]
+        while not self.done.is_set():
+            try:
+                job = self.jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            job["attempts"] += 1
+            startTime = time.time()
+            try:
+                connection.upload(job["filepath"], job["filename"], verbose=False)
+                result = self._receive(connection, startTime)
+                if result == None:
+                    raise serial.SerialException(f"No state vector within {self.jobTimeout}s")
+                if "error" in result:
+                    raise result["error"]
+            except (serial.SerialException, OSError, ValueError) as e:
+                stats["failures"] += 1
+                stats["busyTime"] += time.time() - startTime
+                self._retry(job, e)
+                try:
+                    connection.reconnect()
+                except (serial.SerialException, OSError):
+                    stats["retired"] = True
+                    return
+                continue
+            endTime = time.time()
+
+            stats["jobs"] += 1
+            stats["busyTime"] += endTime - startTime
+            entry = {"index": job["index"], "board": connection.name, "stateVector": result["stateVector"],
+                     "runtime": endTime - startTime, "attempts": job["attempts"], "report": result["report"]}
+            entry.update(self._timer(job))
+            self._complete(job, entry)
+
+    # the next result of the board that was transmitted after startTime, late answers to jobs that
+    # timed out before are dropped
+    def _receive(self, connection, startTime):
+        while True:
+            result = connection.receive(timeout=max(0, startTime + self.jobTimeout - time.time()))
+            if result == None or "error" in result or result["time"] >= startTime:
+                return result
+
+    def _timer(self, job):
+        if not self.predictTimer:
+            return {"timerCycles": None, "timerRuntime": None}
+        emulator = FPGAEmulator(simulate=False)
+        emulator.load(readProgram(job["filepath"], job["filename"]))
+        report = emulator.run()
+        return {"timerCycles": report["timerCycles"], "timerRuntime": report["timerRuntime"]}
+
+    def _retry(self, job, error):
+        if job["attempts"] <= self.maxRetries:
+            self.jobs.put(job)
+        else:
+            self._complete(job, {"index": job["index"], "error": error, "attempts": job["attempts"]})
+
+    def _complete(self, job, entry):
+        with self.lock:
+            self.results[job["index"]] = entry
+            self.pending -= 1
+            if self.pending == 0:
+                self.done.set()
+
+    # per board jobs, failures and utilization (busy time / wall time) and the aggregate throughput
+    def report(self):
+        duration = self.endTime - self.startTime
+        completed = sum(1 for result in self.results if result != None and "stateVector" in result)
+        boards = {}
+        for name, stats in self.boardStats.items():
+            boards[name] = dict(stats)
+            boards[name]["utilization"] = stats["busyTime"] / duration if duration > 0 else 0
+        return {"boards": boards, "jobs": len(self.results), "completed": completed, "duration": duration,
+                "circuitsPerHour": completed / duration * 3600 if duration > 0 else 0}
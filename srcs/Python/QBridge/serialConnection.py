@@ -0,0 +1,118 @@
+from QBridge.tools import ReadbackMonitor, getSerialPorts, uploadProgram
+import asyncio
+import queue
+import threading
+import time
+import serial
+import numpy as np
+
+# Connection to one board. A reader thread blocks in port.read() until bytes arrive or endOfDataGap
+# passes, so an idle connection does not use the CPU. Received bytes are decoded as they come in and
+# every complete state vector is put onto the results queue as
+#   {"board": name, "stateVector": array, "report": ReadbackMonitor report, "time": end of transmission}
+# A state vector is complete when a packet ends, when expectedAmplitudes numbers arrived or when the
+# line stays quiet for endOfDataGap seconds. Errors are put onto the queue as {"board": name, "error": e},
+# after a read error the reader stops (connected is False), after a decoding error it keeps reading.
+# Several connections can share one results queue.
+class BoardConnection():
+    def __init__(self, port, name=None, results=None, roundingThreshold=0.00000001, endOfDataGap=0.5, expectedAmplitudes=None):
+        self.port = port
+        self.name = name if name != None else port.port
+        self.results = results if results != None else queue.Queue()
+        self.expectedAmplitudes = expectedAmplitudes
+        self.monitor = ReadbackMonitor(expectedAmplitudes, roundingThreshold, endOfDataGap)
+        self.received = []
+        self.writeLock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.connected = True
+        self.port.timeout = endOfDataGap
+        self.readThread = threading.Thread(target=self._readLoop, daemon=True)
+        self.readThread.start()
+
+    def _readLoop(self):
+        while not self.stopEvent.is_set():
+            try:
+                data = self.port.read(max(1, self.port.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                if not self.stopEvent.is_set():
+                    self.connected = False
+                    self.results.put({"board": self.name, "error": e})
+                return
+
+            # a decoding error drops the transmission, the connection stays usable
+            try:
+                self._decode(data)
+            except Exception as e:
+                self.received = []
+                self.monitor.reset()
+                self.results.put({"board": self.name, "error": e})
+
+    def _decode(self, data):
+        if len(data) == 0:
+            self._finish()
+            return
+
+        amplitudes = self.monitor.feed(data)
+        decoder = self.monitor.decoder
+        if decoder.mode == "packets":
+            for stateVector in np.split(amplitudes, np.cumsum(decoder.packetLengths)[:-1]):
+                if len(stateVector) > 0:
+                    self._put(stateVector)
+        else:
+            self.received.append(amplitudes)
+            if self.expectedAmplitudes != None and decoder.nDecoded >= self.expectedAmplitudes:
+                self._finish()
+
+    def _put(self, stateVector):
+        self.results.put({"board": self.name, "stateVector": stateVector, "report": self.monitor.report(), "time": time.time()})
+
+    # end of a transmission, hands a framed state vector to the consumers and starts over
+    def _finish(self):
+        if self.monitor.bytesReceived == 0:
+            return
+        if self.monitor.decoder.mode != "packets":
+            self._put(np.concatenate(self.received) if len(self.received) > 0 else np.zeros(0, dtype=np.complex128))
+        self.received = []
+        self.monitor.reset()
+
+    # blocks until the next state vector (or error) of any board sharing the queue, None after timeout seconds
+    def receive(self, timeout=None):
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def receiveAsync(self, timeout=None):
+        return await asyncio.to_thread(self.receive, timeout)
+
+    def send(self, data):
+        with self.writeLock:
+            self.port.write(data)
+
+    def upload(self, filepath, filename, chunkSize=4096, verbose=True):
+        with self.writeLock:
+            return uploadProgram(self.port, filepath, filename, chunkSize, verbose)
+
+    # reopens the port after an error, raises serial.SerialException if the board is still gone
+    def reconnect(self):
+        self.stopEvent.set()
+        self.readThread.join(timeout=self.port.timeout + 1)
+        self.stopEvent.clear()
+        self.port.close()
+        self.port.open()
+        self.received = []
+        self.monitor.reset()
+        self.connected = True
+        self.readThread = threading.Thread(target=self._readLoop, daemon=True)
+        self.readThread.start()
+
+    def close(self):
+        self.stopEvent.set()
+        self.readThread.join(timeout=self.port.timeout + 1)
+        self.port.close()
+
+# opens every port returned by getSerialPorts, all connections put their results onto one queue
+def connectAll(baudRate=460800, **kwargs):
+    results = queue.Queue()
+    ports, portNames = getSerialPorts(baudRate=baudRate)
+    return [BoardConnection(port, name, results, **kwargs) for port, name in zip(ports, portNames)]
@@ -1,12 +1,25 @@
 from qiskit import QuantumCircuit as QC, transpile
 from qiskit_aer import Aer
+import concurrent.futures
+import os
+from QBridge.quantumCircuit import ArrayQuantumCircuit, GATE_TYPES
 import numpy as np
 import copy
 import time
+import pathlib
 
-def runQiskitSimulation(circuit):
-    nQubits = circuit.nQubits
-    qCircuit = QC(nQubits)
+def _toQiskitCircuit(circuit):
+    qCircuit = QC(circuit.nQubits)
+    if isinstance(circuit, ArrayQuantumCircuit):
+        gatesByType = {"h": lambda target, control1, control2: qCircuit.h(target),
+                       "cnot": lambda target, control1, control2: qCircuit.cx(control1, target),
+                       "ccnot": lambda target, control1, control2: qCircuit.ccx(control1, control2, target),
+                       "x": lambda target, control1, control2: qCircuit.x(target),
+                       "t": lambda target, control1, control2: qCircuit.t(target)}
+        gates = [gatesByType[gateType] for gateType in GATE_TYPES]
+        for opcode, target, control1, control2 in circuit:
+            gates[opcode](target, control1, control2)
+        return qCircuit
     for gate in circuit.circuit:
         if gate["type"] == "h":
             qCircuit.h(gate["target"])
@@ -18,27 +31,283 @@ def runQiskitSimulation(circuit):
             qCircuit.x(gate["target"])
         elif gate["type"] == "t":
             qCircuit.t(gate["target"])
+        elif gate["type"] == "u":
+            qCircuit.unitary(gate["matrix"], [gate["target"]])
         else:
             raise Exception("Method not found")
-        
+    return qCircuit
+
+# yields the lines "index: amplitude" of a state vector, nothing is formatted before it is needed
+def formatStateVector(stateVector, onlyNonZero=False):
+    stateVector = np.asarray(stateVector).reshape(-1)
+    indices = np.flatnonzero(stateVector) if onlyNonZero else range(len(stateVector))
+    for i in indices:
+        yield f"{i}: {stateVector[i]}\n"
+
+# writes the formatted state vector straight to a file object or path
+def writeStateVector(stateVector, file, onlyNonZero=False):
+    if isinstance(file, (str, pathlib.Path)):
+        with open(file, "w") as f:
+            writeStateVector(stateVector, f, onlyNonZero)
+        return
+    file.writelines(formatStateVector(stateVector, onlyNonZero))
+
+# Keeps one Aer statevector backend alive and runs lists of circuits as a single job.
+# maxParallelExperiments is the number of circuits Aer simulates at the same time and
+# maxParallelThreads the total number of threads it may use, 0 lets Aer decide.
+class QiskitRunner():
+    def __init__(self, maxParallelExperiments=0, maxParallelThreads=0, optimizationLevel=0):
+        startTime = time.time()
+        self.backend = Aer.get_backend('statevector_simulator')
+        self.backend.set_options(max_parallel_experiments=maxParallelExperiments, max_parallel_threads=maxParallelThreads)
+        self.optimizationLevel = optimizationLevel
+        self.backendTime = time.time() - startTime
+
+    # returns a list of complex128 state vectors and the time spent in every phase of the whole batch
+    def run(self, circuits):
+        timing = {}
+        startTime = time.time()
+        qCircuits = [_toQiskitCircuit(circuit) for circuit in circuits]
+        timing["construction"] = time.time() - startTime
+
+        startTime = time.time()
+        transpiled = transpile(qCircuits, self.backend, optimization_level=self.optimizationLevel)
+        timing["transpile"] = time.time() - startTime
+
+        startTime = time.time()
+        result = self.backend.run(transpiled).result()
+        stateVectors = [np.asarray(result.get_statevector(i)) for i in range(len(transpiled))]
+        timing["execution"] = time.time() - startTime
+
+        timing["total"] = sum(timing.values())
+        return stateVectors, timing
+
+_qiskitRunner = None
+
+# returns the state vector as a complex128 array and the time spent in every phase in seconds, the
+# backend is only looked up on the first call (timing["backend"] is 0 afterwards)
+def runQiskitSimulation(circuit):
+    global _qiskitRunner
+    backendTime = 0
+    if _qiskitRunner == None:
+        _qiskitRunner = QiskitRunner()
+        backendTime = _qiskitRunner.backendTime
+
+    stateVectors, timing = _qiskitRunner.run([circuit])
+    timing["backend"] = backendTime
+    timing["total"] += backendTime
+    return stateVectors[0], timing
+
+# returns the state vector as a complex128 array and the time spent in every phase in seconds,
+# engine is "loop", "vectorized", "threaded", "blocked", "chunked", "sparse" or "fixedPoint", dtype and
+# path are only used by the engines of CustomQCSimulator. The sparse engine returns (indices, values)
+# of the nonzero amplitudes instead of the array above SparseQCSimulator's maxDenseQubits.
+def runCustomSimulation(circuit, engine="loop", nativeCcnot=False, threads=None, dtype=np.complex128, path=None):
+    timing = {}
     startTime = time.time()
-    statevector_simulator = Aer.get_backend('statevector_simulator')
-    transpiled_qc = transpile(qCircuit, statevector_simulator, optimization_level=0)
-    result = statevector_simulator.run(transpiled_qc).result()
-    stateVector = np.asarray(result.get_statevector())
-    endTime = time.time()
-
-    stateVectorString = ""
-    for i in range(len(stateVector)):
-        stateVectorString += f"{i}: {stateVector[i]}\n"
-    return stateVectorString, endTime-startTime
-
-def runCustomSimulation(circuit):
-    simulator = CustomQCSimulator(circuit.nQubits)
+    if engine == "sparse":
+        simulator = SparseQCSimulator(circuit.nQubits)
+    elif engine == "fixedPoint":
+        simulator = FixedPointQCSimulator(circuit.nQubits, nativeCcnot=nativeCcnot)
+    else:
+        simulator = CustomQCSimulator(circuit.nQubits, engine=engine, nativeCcnot=nativeCcnot, threads=threads, dtype=dtype, path=path)
+    timing["construction"] = time.time() - startTime
+
     startTime = time.time()
-    stateVector =  simulator.run(circuit.circuit)
-    endTime = time.time()
-    return stateVector, endTime-startTime
+    stateVector =  simulator.run(circuit if isinstance(circuit, ArrayQuantumCircuit) else circuit.circuit)
+    timing["execution"] = time.time() - startTime
+
+    timing["total"] = sum(timing.values())
+    return stateVector, timing
+
+# applies the gate to all amplitude pairs of a flat state vector at once by viewing it as a
+# (2, 2, ..., 2) tensor, axis nQubits-1-q belongs to qubit q
+def applyGate(stateVector, nQubits, matrix_2x2, target, controls=[]):
+    tensor = stateVector.reshape((2,) * nQubits)
+    index_a, index_b = _pairIndices(nQubits, target, controls)
+    _applyToPairs(tensor, index_a, index_b, matrix_2x2)
+
+def _applyToPairs(tensor, index_a, index_b, matrix_2x2):
+    original_a = tensor[index_a]
+    original_b = tensor[index_b]
+
+    new_b = matrix_2x2[1][0] * original_a + matrix_2x2[1][1] * original_b
+    tensor[index_a] = matrix_2x2[0][0] * original_a + matrix_2x2[0][1] * original_b
+    tensor[index_b] = new_b
+
+_threadPools = {}
+
+# one pool per thread count for the whole process, the threads are started once and kept
+def _getThreadPool(threads):
+    if not threads in _threadPools:
+        _threadPools[threads] = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+    return _threadPools[threads]
+
+# Same result as applyGate, but the amplitude pairs are split into slabs by fixing the highest qubits
+# that are neither target nor control, so every slab is a few large contiguous blocks. The slabs are
+# computed on the pool (numpy releases the GIL in the arithmetic) and the call returns once all of
+# them are done, so threads only synchronise between gates.
+def applyGateThreaded(stateVector, nQubits, matrix_2x2, target, controls, pool, nSlabs):
+    tensor = stateVector.reshape((2,) * nQubits)
+    index_a, index_b = _pairIndices(nQubits, target, controls)
+    freeQubits = [qubit for qubit in reversed(range(nQubits)) if qubit != target and not qubit in controls]
+    splitQubits = freeQubits[:min(len(freeQubits), int(np.ceil(np.log2(max(nSlabs, 1)))))]
+
+    futures = []
+    for slab in range(2**len(splitQubits)):
+        slab_a = list(index_a)
+        slab_b = list(index_b)
+        for i, qubit in enumerate(splitQubits):
+            bit = (slab >> i) & 1
+            slab_a[nQubits-1-qubit] = slab_b[nQubits-1-qubit] = slice(bit, bit+1)
+        futures.append(pool.submit(_applyToPairs, tensor, tuple(slab_a), tuple(slab_b), matrix_2x2))
+    for future in futures:
+        future.result()
+
+# index tuples selecting all a and all b amplitudes of a (2, 2, ..., 2) shaped state vector
+def _pairIndices(nQubits, target, controls):
+    index = [slice(None)] * nQubits
+    for control in controls:
+        index[nQubits-1-control] = slice(1, 2)
+    index[nQubits-1-target] = slice(0, 1)
+    index_a = tuple(index)
+    index[nQubits-1-target] = slice(1, 2)
+    index_b = tuple(index)
+    return index_a, index_b
+
+# Cache blocked execution of a list of (matrix, target, controls) operations. Consecutive operations
+# whose target lies below blockQubits are applied to one tile of 2^blockQubits amplitudes after the
+# other, so the tile stays in cache for the whole group, controls above the tile are constant within
+# a tile. An operation on a high target sweeps the whole state vector, unless that qubit is the target
+# again within the next lookahead operations; then it is first swapped with the low qubit that is
+# needed last. The qubit order is restored at the end. Returns the DRAM traffic of both ways under the
+# model that every sweep, tile pass and swap reads and writes the whole state vector once.
+def runBlocked(stateVector, nQubits, operations, blockQubits=16, lookahead=32):
+    blockQubits = min(blockQubits, nQubits)
+    tileSize = 2**blockQubits
+    sweepBytes = 2 * stateVector.nbytes
+    stats = {"gates": len(operations), "groups": 0, "swaps": 0, "directSweeps": 0, "bytesMoved": 0,
+             "bytesMovedUnblocked": sweepBytes * len(operations)}
+    layout = list(range(nQubits)) # physical position of every logical qubit
+
+    def swap(physical1, physical2):
+        tensor = stateVector.reshape((2,) * nQubits)
+        stateVector[:] = np.ascontiguousarray(tensor.swapaxes(nQubits-1-physical1, nQubits-1-physical2)).reshape(-1)
+        logical1, logical2 = layout.index(physical1), layout.index(physical2)
+        layout[logical1], layout[logical2] = physical2, physical1
+        stats["swaps"] += 1
+        stats["bytesMoved"] += sweepBytes
+
+    def runGroup(group):
+        for tile in range(len(stateVector) // tileSize):
+            block = stateVector[tile*tileSize:(tile+1)*tileSize]
+            for matrix_2x2, target, controls in group:
+                if all((tile >> (control - blockQubits)) & 1 for control in controls if control >= blockQubits):
+                    applyGate(block, blockQubits, matrix_2x2, target, [control for control in controls if control < blockQubits])
+        stats["groups"] += 1
+        stats["bytesMoved"] += sweepBytes
+
+    group = []
+    for index, (matrix_2x2, target, controls) in enumerate(operations):
+        if layout[target] >= blockQubits:
+            if len(group) > 0:
+                runGroup(group)
+                group = []
+            upcoming = [operation[1] for operation in operations[index+1:index+1+lookahead]]
+            if not target in upcoming:
+                applyGate(stateVector, nQubits, matrix_2x2, layout[target], [layout[control] for control in controls])
+                stats["directSweeps"] += 1
+                stats["bytesMoved"] += sweepBytes
+                continue
+            # the low qubit that is the target again last (or never) leaves the tile
+            lowQubits = [logical for logical in range(nQubits) if layout[logical] < blockQubits]
+            victim = max(lowQubits, key=lambda logical: upcoming.index(logical) if logical in upcoming else len(upcoming))
+            swap(layout[target], layout[victim])
+        group.append((matrix_2x2, layout[target], [layout[control] for control in controls]))
+    if len(group) > 0:
+        runGroup(group)
+
+    if layout != list(range(nQubits)):
+        axes = [0] * nQubits
+        for logical in range(nQubits):
+            axes[nQubits-1-logical] = nQubits-1-layout[logical]
+        stateVector[:] = np.ascontiguousarray(stateVector.reshape((2,) * nQubits).transpose(axes)).reshape(-1)
+        stats["bytesMoved"] += sweepBytes
+
+    stats["bytesPerGateUnblocked"] = sweepBytes if len(operations) > 0 else 0
+    stats["bytesPerGate"] = stats["bytesMoved"] / len(operations) if len(operations) > 0 else 0
+    return stats
+
+# |0...0> state vector of the given dtype, complex64 halves the footprint. With a path the vector is a
+# .npy memory map on disk (the file is created sparse, so only the first page is written), otherwise
+# it is an array in memory
+def createStateVector(nQubits, dtype=np.complex128, path=None):
+    if path == None:
+        stateVector = np.zeros(2**nQubits, dtype=dtype)
+    else:
+        stateVector = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(2**nQubits,))
+    stateVector[0] = 1
+    return stateVector
+
+# Applies a list of (matrix, target, controls) operations to a state vector that does not have to fit
+# in memory, e.g. a memory map from createStateVector, with at most two chunks of 2^chunkQubits
+# amplitudes loaded at a time. Consecutive operations whose target lies below chunkQubits share one
+# pass that reads and writes every chunk once in order. An operation on a high target is a pass of its
+# own over the chunk pairs that differ only in the target bit, which reads two sequential streams.
+# Controls above the chunk are resolved per chunk. Returns the passes and the bytes read and written.
+def applyOperationsChunked(stateVector, nQubits, operations, chunkQubits=22):
+    chunkQubits = min(chunkQubits, nQubits)
+    chunkSize = 2**chunkQubits
+    nChunks = len(stateVector) // chunkSize
+    stats = {"gates": len(operations), "passes": 0, "bytesRead": 0, "bytesWritten": 0}
+
+    def isActive(chunk, controls):
+        return all((chunk >> (control - chunkQubits)) & 1 for control in controls if control >= chunkQubits)
+
+    def lowControls(controls):
+        return [control for control in controls if control < chunkQubits]
+
+    passes = []
+    for matrix_2x2, target, controls in operations:
+        matrix_2x2 = np.asarray(matrix_2x2, dtype=stateVector.dtype)
+        if target < chunkQubits and len(passes) > 0 and passes[-1][0][1] < chunkQubits:
+            passes[-1].append((matrix_2x2, target, controls))
+        else:
+            passes.append([(matrix_2x2, target, controls)])
+
+    for operationsOfPass in passes:
+        target = operationsOfPass[0][1]
+        if target < chunkQubits:
+            for chunk in range(nChunks):
+                active = [operation for operation in operationsOfPass if isActive(chunk, operation[2])]
+                if len(active) == 0:
+                    continue
+                block = np.array(stateVector[chunk*chunkSize:(chunk+1)*chunkSize])
+                for matrix_2x2, target, controls in active:
+                    applyGate(block, chunkQubits, matrix_2x2, target, lowControls(controls))
+                stateVector[chunk*chunkSize:(chunk+1)*chunkSize] = block
+                stats["bytesRead"] += block.nbytes
+                stats["bytesWritten"] += block.nbytes
+        else:
+            matrix_2x2, target, controls = operationsOfPass[0]
+            stride = 2**(target - chunkQubits)
+            for chunk in range(nChunks):
+                if chunk & stride or not isActive(chunk, controls):
+                    continue
+                # the two chunks stacked are a state vector of chunkQubits+1 qubits with the target on top
+                pair = np.empty(2 * chunkSize, dtype=stateVector.dtype)
+                pair[:chunkSize] = stateVector[chunk*chunkSize:(chunk+1)*chunkSize]
+                pair[chunkSize:] = stateVector[(chunk+stride)*chunkSize:(chunk+stride+1)*chunkSize]
+                applyGate(pair, chunkQubits+1, matrix_2x2, chunkQubits, lowControls(controls))
+                stateVector[chunk*chunkSize:(chunk+1)*chunkSize] = pair[:chunkSize]
+                stateVector[(chunk+stride)*chunkSize:(chunk+stride+1)*chunkSize] = pair[chunkSize:]
+                stats["bytesRead"] += pair.nbytes
+                stats["bytesWritten"] += pair.nbytes
+        stats["passes"] += 1
+
+    if isinstance(stateVector, np.memmap):
+        stateVector.flush()
+    return stats
 
 class CustomQCSimulator():
     H = np.array([[complex(1/np.sqrt(2), 0),complex(1/np.sqrt(2), 0)],
@@ -50,21 +319,54 @@ class CustomQCSimulator():
     T = np.array([[complex(1, 0),complex(0, 0)],
                 [complex(0, 0),complex(np.cos(np.pi/4) + 1j*np.sin(np.pi/4), 0)]])
 
-    def __init__(self, nQbits):
+    engines = ["loop", "vectorized", "threaded", "blocked", "chunked"]
+    # below this the threaded engine runs like the vectorized one, the sweeps are too short to split
+    threadedMinQubits = 16
+
+    # threads is only used by the threaded engine, None uses one thread per CPU, blockQubits only by
+    # the blocked engine and chunkQubits only by the chunked engine. dtype and path are passed to
+    # createStateVector, the chunked engine with a path simulates state vectors larger than the memory
+    def __init__(self, nQbits, engine="loop", nativeCcnot=False, threads=None, blockQubits=16, chunkQubits=22,
+                 dtype=np.complex128, path=None):
+        if not engine in self.engines:
+            raise ValueError("engine must be one of " + ", ".join(self.engines))
         self.nQbits = nQbits
-        self.stateVector = np.array([[complex(1, 0)],[complex(0, 0)]])
-        for i in range(1, nQbits):
-            self.stateVector = np.kron(self.stateVector, np.array([[complex(1, 0)],[complex(0, 0)]]))
-        self.stateVector = self.stateVector.astype(np.complex128)
+        self.engine = engine
+        self.nativeCcnot = nativeCcnot
+        self.gatePasses = 0 # number of sweeps over the state vector
+        self.threads = threads if threads != None else os.cpu_count()
+        if engine == "threaded":
+            self.pool = _getThreadPool(self.threads)
+        # the blocked and chunked engines collect the operations and run them with runBlocked or
+        # applyOperationsChunked when the state vector is read, blockStats holds the report of the last run
+        self.blockQubits = blockQubits
+        self.chunkQubits = chunkQubits
+        self.pendingOperations = []
+        self.blockStats = None
+        # flat state vector initialised directly to |0...0>, the loop engine uses a column vector
+        self.stateVector = createStateVector(nQbits, dtype, path)
+        if engine == "loop":
+            self.stateVector = self.stateVector.reshape(-1, 1)
     
+    # flat view of the state vector, use formatStateVector to turn it into text
     def getStateVector(self):
-        stateVectorString = ""
-        self.stateVector = self.stateVector.flatten()
-        for i in range(len(self.stateVector)):
-            stateVectorString += f"{i}: {self.stateVector[i]}\n"
-        return stateVectorString
+        if len(self.pendingOperations) > 0 and self.engine == "chunked":
+            self.blockStats = applyOperationsChunked(self.stateVector, self.nQbits, self.pendingOperations, self.chunkQubits)
+        elif len(self.pendingOperations) > 0:
+            self.blockStats = runBlocked(self.stateVector, self.nQbits, self.pendingOperations, self.blockQubits)
+        self.pendingOperations = []
+        return self.stateVector.reshape(-1)
 
+    # circuit is either a list of gate dicts or an ArrayQuantumCircuit
     def run(self, circuit):
+        self._applyCircuit(circuit)
+        stateVector = self.getStateVector()
+        return stateVector
+
+    def _applyCircuit(self, circuit):
+        if isinstance(circuit, ArrayQuantumCircuit):
+            self._runOpcodes(circuit)
+            return
         for gate in circuit:
             if gate["type"] == "h":
                 self._operation(self.H, gate["target"], control=None)
@@ -76,12 +378,25 @@ class CustomQCSimulator():
                 self._operation(self.X, gate["target"], control=None)
             elif gate["type"] == "t":
                 self._operation(self.T, gate["target"], control=None)
+            elif gate["type"] == "u":
+                self._operation(np.asarray(gate["matrix"]), gate["target"], control=None)
             else:
                 raise Exception("Method not found")
-        stateVector = self.getStateVector()
-        return stateVector
+
+    def _runOpcodes(self, circuit):
+        operationsByType = {"h": lambda target, control1, control2: self._operation(self.H, target, control=None),
+                            "cnot": lambda target, control1, control2: self._operation(self.X, target, control=control1),
+                            "ccnot": lambda target, control1, control2: self._ccnot(target, control1, control2),
+                            "x": lambda target, control1, control2: self._operation(self.X, target, control=None),
+                            "t": lambda target, control1, control2: self._operation(self.T, target, control=None)}
+        operations = [operationsByType[gateType] for gateType in GATE_TYPES]
+        for opcode, target, control1, control2 in circuit:
+            operations[opcode](target, control1, control2)
 
     def _ccnot(self, target, control1, control2):
+        if self.nativeCcnot:
+            self._multiControlledOperation(self.X, target, [control1, control2])
+            return
         self._operation(self.H, target, control=None)
         self._operation(self.X, target, control=control2)
         for _ in range(3):
@@ -102,6 +417,10 @@ class CustomQCSimulator():
         self._operation(self.X, target=control2, control=control1)
 
     def _operation(self, matrix_2x2, target, control=None):
+        self.gatePasses += 1
+        if self.engine in ["vectorized", "threaded", "blocked", "chunked"]:
+            self._vectorizedOperation(matrix_2x2, target, [] if control == None else [control])
+            return
         for i in range(0, 2**(self.nQbits-1)):
             index_a, index_b = self._getElementsAandB(i, target)
            
@@ -120,6 +439,42 @@ class CustomQCSimulator():
                 self.stateVector[index_a][0] = new_a
                 self.stateVector[index_b][0] = new_b
 
+    # applies the gate to the target qubit only for the amplitude pairs where every control bit
+    # is set, so a k-controlled gate touches 2^(nQbits-k) amplitudes instead of all of them
+    def _multiControlledOperation(self, matrix_2x2, target, controls):
+        if target in controls or len(set(controls)) != len(controls):
+            raise ValueError("target and control qubits must all be different")
+        self.gatePasses += 1
+        if self.engine in ["vectorized", "threaded", "blocked", "chunked"]:
+            self._vectorizedOperation(matrix_2x2, target, controls)
+            return
+
+        controlMask = 0
+        for control in controls:
+            controlMask |= 1 << control
+        fixedBits = sorted(list(controls) + [target])
+        for i in range(0, 2**(self.nQbits-len(fixedBits))):
+            index_a = i
+            for bit in fixedBits:
+                index_a, _ = self._getElementsAandB(index_a, bit)
+            index_a |= controlMask
+            index_b = index_a | (1 << target)
+
+            original_a = copy.deepcopy(self.stateVector[index_a])
+            original_b = copy.deepcopy(self.stateVector[index_b])
+
+            self.stateVector[index_a][0] = (matrix_2x2[0][0] * original_a + matrix_2x2[0][1] * original_b)[0]
+            self.stateVector[index_b][0] = (matrix_2x2[1][0] * original_a + matrix_2x2[1][1] * original_b)[0]
+
+    def _vectorizedOperation(self, matrix_2x2, target, controls):
+        if self.engine in ["blocked", "chunked"]:
+            self.pendingOperations.append((matrix_2x2, target, list(controls)))
+            return
+        if self.engine == "threaded" and self.threads > 1 and self.nQbits >= self.threadedMinQubits:
+            applyGateThreaded(self.stateVector, self.nQbits, matrix_2x2, target, controls, self.pool, self.threads)
+            return
+        applyGate(self.stateVector, self.nQbits, matrix_2x2, target, controls)
+
     def _getElementsAandB(self, n, target):
         mask = (1 << target) - 1
         not_mask = ~mask
@@ -136,3 +491,275 @@ class CustomQCSimulator():
     
     def _is_xth_bit_set(self, a, x):
         return (a >> x) & 1
+
+
+# Stores only the nonzero amplitudes as sorted basis state indices and values, which lets circuits
+# that are mostly X/CNOT/CCNOT run on far more qubits than the dense simulator. ccnot is always applied
+# natively. Once more than fillThreshold of all amplitudes are nonzero the state is handed over to the
+# vectorized CustomQCSimulator, unless the dense vector would have more than maxDenseQubits qubits.
+class SparseQCSimulator():
+    def __init__(self, nQbits, fillThreshold=0.1, maxDenseQubits=28, zeroThreshold=1e-14):
+        if nQbits > 62:
+            raise ValueError("nQbits must be at most 62")
+        self.nQbits = nQbits
+        self.fillThreshold = fillThreshold
+        self.maxDenseQubits = maxDenseQubits
+        self.zeroThreshold = zeroThreshold
+        self.indices = np.zeros(1, dtype=np.int64)
+        self.values = np.ones(1, dtype=np.complex128)
+        self.dense = None # CustomQCSimulator after switching to the dense engine
+        self.gatePasses = 0
+
+    def fillRatio(self):
+        if self.dense != None:
+            return 1.0
+        return len(self.indices) / 2**self.nQbits
+
+    # (indices, values) of the nonzero amplitudes
+    def getSparseStateVector(self):
+        if self.dense != None:
+            stateVector = self.dense.getStateVector()
+            indices = np.flatnonzero(stateVector)
+            return indices, stateVector[indices]
+        return self.indices, self.values
+
+    # dense complex128 array, refused above maxDenseQubits where it would not fit in memory
+    def getStateVector(self):
+        if self.dense != None:
+            return self.dense.getStateVector()
+        if self.nQbits > self.maxDenseQubits:
+            raise ValueError(f"a dense state vector of {self.nQbits} qubits is too large, use getSparseStateVector")
+        stateVector = np.zeros(2**self.nQbits, dtype=np.complex128)
+        stateVector[self.indices] = self.values
+        return stateVector
+
+    # circuit is either a list of gate dicts or an ArrayQuantumCircuit, returns the dense state vector
+    # up to maxDenseQubits and (indices, values) of the nonzero amplitudes above
+    def run(self, circuit):
+        self._applyCircuit(circuit)
+        if self.nQbits > self.maxDenseQubits:
+            return self.getSparseStateVector()
+        return self.getStateVector()
+
+    def _applyCircuit(self, circuit):
+        if isinstance(circuit, ArrayQuantumCircuit):
+            self._runOpcodes(circuit)
+            return
+        gates = circuit
+        for i in range(len(gates)):
+            if self.dense != None:
+                self.dense._applyCircuit(gates[i:])
+                return
+            gate = gates[i]
+            controls = [q for q in [gate["control1"], gate["control2"]] if q != None]
+            if gate["type"] == "h":
+                self._operation(CustomQCSimulator.H, gate["target"], controls)
+            elif gate["type"] in ["x", "cnot", "ccnot"]:
+                self._x(gate["target"], controls)
+            elif gate["type"] == "t":
+                self._phase(CustomQCSimulator.T[1][1], gate["target"], controls)
+            elif gate["type"] == "u":
+                self._operation(np.asarray(gate["matrix"]), gate["target"], controls)
+            else:
+                raise Exception("Method not found")
+            self._checkFill()
+
+    def _runOpcodes(self, circuit):
+        operationsByType = {"h": lambda target, controls: self._operation(CustomQCSimulator.H, target, controls),
+                            "cnot": self._x,
+                            "ccnot": self._x,
+                            "x": self._x,
+                            "t": lambda target, controls: self._phase(CustomQCSimulator.T[1][1], target, controls)}
+        operations = [operationsByType[gateType] for gateType in GATE_TYPES]
+        for i, (opcode, target, control1, control2) in enumerate(circuit):
+            if self.dense != None:
+                self.dense._applyCircuit(circuit[i:])
+                return
+            operations[opcode](target, [qubit for qubit in [control1, control2] if qubit >= 0])
+            self._checkFill()
+
+    def _checkFill(self):
+        if self.fillRatio() > self.fillThreshold and self.nQbits <= self.maxDenseQubits:
+            self.dense = CustomQCSimulator(self.nQbits, engine="vectorized", nativeCcnot=True)
+            self.dense.stateVector[0] = 0
+            self.dense.stateVector[self.indices] = self.values
+            self.indices = None
+            self.values = None
+
+    def _controlled(self, controls):
+        mask = 0
+        for control in controls:
+            mask |= 1 << control
+        return (self.indices & mask) == mask
+
+    # permutes the basis states, the number of nonzero amplitudes does not change
+    def _x(self, target, controls):
+        self.gatePasses += 1
+        selected = self._controlled(controls)
+        self.indices = np.where(selected, self.indices ^ (1 << target), self.indices)
+        order = np.argsort(self.indices, kind="stable")
+        self.indices = self.indices[order]
+        self.values = self.values[order]
+
+    def _phase(self, phase, target, controls):
+        self.gatePasses += 1
+        selected = self._controlled(controls) & ((self.indices >> target) & 1 == 1)
+        self.values = np.where(selected, self.values * phase, self.values)
+
+    def _operation(self, matrix_2x2, target, controls):
+        self.gatePasses += 1
+        selected = self._controlled(controls)
+        indices = self.indices[selected]
+        values = self.values[selected]
+
+        # amplitudes a (target bit 0) and b (target bit 1) of every affected pair
+        pairs, pairOf = np.unique(indices & ~(1 << target), return_inverse=True)
+        isB = (indices >> target) & 1 == 1
+        a = np.zeros(len(pairs), dtype=np.complex128)
+        b = np.zeros(len(pairs), dtype=np.complex128)
+        a[pairOf[~isB]] = values[~isB]
+        b[pairOf[isB]] = values[isB]
+        new_a = matrix_2x2[0][0] * a + matrix_2x2[0][1] * b
+        new_b = matrix_2x2[1][0] * a + matrix_2x2[1][1] * b
+
+        indices = np.concatenate([self.indices[~selected], pairs, pairs | (1 << target)])
+        values = np.concatenate([self.values[~selected], new_a, new_b])
+        nonzero = np.abs(values) > self.zeroThreshold
+        order = np.argsort(indices[nonzero], kind="stable")
+        self.indices = indices[nonzero][order]
+        self.values = values[nonzero][order]
+
+
+# Reproduces the fixed point arithmetic of ALU.vhd: real and imaginary parts are signed numbers with
+# precision bits and precision-2 fractional bits, products keep the sign bit and the bits
+# precision-2 ... 2*precision-4 of the full product, negation is a bitwise not and sums wrap around.
+# The default precision of 32 bits is what the FPGA uses, 16, 20 and 24 bits are the alternatives
+# listed in ALU.vhd. Like the FPGA, ccnot is decomposed unless nativeCcnot is True.
+class FixedPointQCSimulator():
+    # 3 bit codes of the matrix entries as in controlUnit.vhd: 0 -> 0, 1 -> 1, 2 -> -1, 3 -> 1/sqrt(2),
+    # 4 -> -1/sqrt(2), 5 -> e^(i*pi/4)
+    H = [3, 3, 3, 4]
+    T = [1, 0, 0, 5]
+    X = [0, 1, 1, 0]
+    oneOverRoot2_32Bit = 0b00101101010000010011110011001100
+
+    def __init__(self, nQbits, precision=32, nativeCcnot=False):
+        if precision < 8 or precision > 32:
+            raise ValueError("precision must be between 8 and 32 bits")
+        self.nQbits = nQbits
+        self.precision = precision
+        self.nativeCcnot = nativeCcnot
+        self.oneOverRoot2 = self.oneOverRoot2_32Bit >> (32 - precision)
+        self.real = np.zeros(2**nQbits, dtype=np.int32)
+        self.imag = np.zeros(2**nQbits, dtype=np.int32)
+        self.real[0] = 1 << (precision-2)
+        self.gatePasses = 0
+
+    def getFixedPointStateVector(self):
+        return self.real, self.imag
+
+    def getStateVector(self):
+        stateVector = np.empty(2**self.nQbits, dtype=np.complex128)
+        stateVector.real = self.real / 2**(self.precision-2)
+        stateVector.imag = self.imag / 2**(self.precision-2)
+        return stateVector
+
+    # circuit is either a list of gate dicts or an ArrayQuantumCircuit
+    def run(self, circuit):
+        self._applyCircuit(circuit)
+        return self.getStateVector()
+
+    def _applyCircuit(self, circuit):
+        if isinstance(circuit, ArrayQuantumCircuit):
+            self._runOpcodes(circuit)
+            return
+        for gate in circuit:
+            if gate["type"] == "h":
+                self._operation(self.H, gate["target"])
+            elif gate["type"] == "cnot":
+                self._operation(self.X, gate["target"], [gate["control1"]])
+            elif gate["type"] == "ccnot":
+                self._ccnot(gate["target"], gate["control1"], gate["control2"])
+            elif gate["type"] == "x":
+                self._operation(self.X, gate["target"])
+            elif gate["type"] == "t":
+                self._operation(self.T, gate["target"])
+            else:
+                raise Exception("Method not found")
+
+    def _runOpcodes(self, circuit):
+        operationsByType = {"h": lambda target, control1, control2: self._operation(self.H, target),
+                            "cnot": lambda target, control1, control2: self._operation(self.X, target, [control1]),
+                            "ccnot": lambda target, control1, control2: self._ccnot(target, control1, control2),
+                            "x": lambda target, control1, control2: self._operation(self.X, target),
+                            "t": lambda target, control1, control2: self._operation(self.T, target)}
+        operations = [operationsByType[gateType] for gateType in GATE_TYPES]
+        for opcode, target, control1, control2 in circuit:
+            operations[opcode](target, control1, control2)
+
+    # same decomposition as FPGAQCCompiler._ccnot
+    def _ccnot(self, target, control1, control2):
+        if self.nativeCcnot:
+            self._operation(self.X, target, [control1, control2])
+            return
+        self._operation(self.H, target)
+        self._operation(self.X, target, [control2])
+        for _ in range(3):
+            self._operation(self.T, target)
+        self._operation(self.X, target, [control1])
+        self._operation(self.T, target)
+        self._operation(self.X, target, [control2])
+        for _ in range(3):
+            self._operation(self.T, target)
+        self._operation(self.X, target, [control1])
+        self._operation(self.T, target)
+        self._operation(self.T, control2)
+        self._operation(self.H, target)
+        self._operation(self.X, control2, [control1])
+        self._operation(self.T, control1)
+        for _ in range(3):
+            self._operation(self.T, control2)
+        self._operation(self.X, control2, [control1])
+
+    def _operation(self, matrixCodes, target, controls=[]):
+        self.gatePasses += 1
+        shape = (2,) * self.nQbits
+        real = self.real.reshape(shape)
+        imag = self.imag.reshape(shape)
+        index_a, index_b = _pairIndices(self.nQbits, target, controls)
+
+        a = (real[index_a].astype(np.int64), imag[index_a].astype(np.int64))
+        b = (real[index_b].astype(np.int64), imag[index_b].astype(np.int64))
+        new_a = self._add(self._multiply(a, matrixCodes[0]), self._multiply(b, matrixCodes[1]))
+        new_b = self._add(self._multiply(a, matrixCodes[2]), self._multiply(b, matrixCodes[3]))
+
+        real[index_a], imag[index_a] = new_a
+        real[index_b], imag[index_b] = new_b
+
+    # wraps int64 values around to signed numbers with precision bits
+    def _wrap(self, x):
+        half = 1 << (self.precision-1)
+        return ((x + half) & ((1 << self.precision) - 1)) - half
+
+    # resize and bit selection of the ALU after multiplying with 1/sqrt(2)
+    def _scale(self, x):
+        product = x * self.oneOverRoot2
+        low = (product >> (self.precision-2)) & ((1 << (self.precision-1)) - 1)
+        return np.where(product < 0, low - (1 << (self.precision-1)), low)
+
+    def _multiply(self, x, code):
+        real, imag = x
+        if code == 1:
+            return real, imag
+        elif code == 2:
+            return ~real, ~imag
+        elif code == 3:
+            return self._scale(real), self._scale(imag)
+        elif code == 4:
+            return ~self._scale(real), ~self._scale(imag)
+        elif code == 5:
+            return self._scale(self._wrap(real - imag)), self._scale(self._wrap(real + imag))
+        return np.zeros_like(real), np.zeros_like(imag)
+
+    def _add(self, x, y):
+        return self._wrap(x[0] + y[0]), self._wrap(x[1] + y[1])
@@ -2,7 +2,14 @@ import serial
 import serial.tools.list_ports
 import time
 import pathlib
+import numpy as np
 from tqdm import tqdm
+from QBridge.protocol import PacketDecoder, toFixedPoint, SYNC_BYTE, FRACTIONAL_BITS
+
+START_BYTE = 0x01
+END_BYTE = 0x81
+FRAME_LENGTH = 12 # start byte, 10 bytes carrying 7 bits each, end byte
+# the real and imaginary parts are signed 32 bit numbers with FRACTIONAL_BITS (30) fractional bits
 
 
 def convertToDecimal(binary_string, roundingThreshold = 0.00000001):
@@ -29,6 +36,188 @@ def convertToComplex(binary_string, roundingThreshold = 0.00000001):
     c = complex(real, imaginary)
     return c
 
+# vectorised version of convertToDecimal for int32 arrays
+def convertFixedPoint(values, roundingThreshold = 0.00000001):
+    values = np.asarray(values, dtype=np.int32) / 2**FRACTIONAL_BITS
+    values[np.abs(values) < roundingThreshold] = 0
+    return values
+
+# Decodes the framed state vector stream sent by uartTransmitter.vhd. Chunks of any size can be
+# passed to feed(), incomplete frames are kept until the rest arrives. Frames that are not exactly
+# start byte, 10 data bytes, end byte are dropped, like readSerial did.
+class StateVectorDecoder():
+    def __init__(self, roundingThreshold = 0.00000001):
+        self.roundingThreshold = roundingThreshold
+        self.buffer = np.zeros(0, dtype=np.uint8)
+        self.nDecoded = 0
+        self.framingErrors = 0 # end bytes that did not close a valid frame
+
+    def reset(self):
+        self.__init__(self.roundingThreshold)
+
+    # returns the amplitudes completed by this chunk as a complex128 array
+    def feed(self, chunk):
+        data = np.concatenate([self.buffer, np.frombuffer(chunk, dtype=np.uint8)])
+        if len(data) < FRAME_LENGTH:
+            self.buffer = data
+            return np.zeros(0, dtype=np.complex128)
+
+        isMarker = (data == START_BYTE) | (data == END_BYTE)
+        markerCount = np.concatenate([[0], np.cumsum(isMarker)])
+        starts = np.flatnonzero(data[:len(data)-FRAME_LENGTH+1] == START_BYTE)
+        ends = starts + FRAME_LENGTH - 1
+        # exactly one marker (the end byte) after the start byte
+        valid = (data[ends] == END_BYTE) & (markerCount[ends+1] - markerCount[starts+1] == 1)
+        starts = starts[valid]
+
+        keepFrom = len(data) - FRAME_LENGTH + 1
+        if len(starts) > 0:
+            keepFrom = max(keepFrom, starts[-1] + FRAME_LENGTH)
+        self.framingErrors += int(np.count_nonzero(data[:keepFrom] == END_BYTE)) - len(starts)
+        self.buffer = data[keepFrom:]
+
+        payload = (data[starts[:, None] + np.arange(1, FRAME_LENGTH-1)] >> 1).astype(np.uint64)
+        # the upper 64 of the 70 transmitted bits are the number, the last 6 bits are padding
+        word = np.zeros(len(starts), dtype=np.uint64)
+        for i in range(9):
+            word |= payload[:, i] << np.uint64(57 - 7*i)
+        word |= payload[:, 9] >> np.uint64(6)
+
+        amplitudes = np.empty(len(starts), dtype=np.complex128)
+        amplitudes.real = convertFixedPoint((word >> np.uint64(32)).astype(np.uint32).view(np.int32), self.roundingThreshold)
+        amplitudes.imag = convertFixedPoint((word & np.uint64(0xFFFFFFFF)).astype(np.uint32).view(np.int32), self.roundingThreshold)
+        self.nDecoded += len(amplitudes)
+        return amplitudes
+
+# Decodes either the framed stream of uartTransmitter.vhd or the packets of QBridge/protocol.py, the
+# format is selected by the first byte of the transmission. Same interface as StateVectorDecoder.
+class AutoDecoder():
+    def __init__(self, roundingThreshold = 0.00000001):
+        self.roundingThreshold = roundingThreshold
+        self.frameDecoder = StateVectorDecoder(roundingThreshold)
+        self.packetDecoder = PacketDecoder()
+        self.mode = None # "frames" or "packets" once the first byte arrived
+        self.packetAmplitudes = 0
+        self.packetLengths = [] # lengths of the packets completed by the last chunk
+
+    def reset(self):
+        self.__init__(self.roundingThreshold)
+
+    @property
+    def buffer(self):
+        return self.packetDecoder.buffer if self.mode == "packets" else self.frameDecoder.buffer
+
+    @property
+    def nDecoded(self):
+        return self.packetAmplitudes if self.mode == "packets" else self.frameDecoder.nDecoded
+
+    @property
+    def framingErrors(self):
+        return self.packetDecoder.checksumErrors if self.mode == "packets" else self.frameDecoder.framingErrors
+
+    def feed(self, chunk):
+        if self.mode == None and len(chunk) > 0:
+            self.mode = "packets" if chunk[0] == SYNC_BYTE else "frames"
+        if self.mode != "packets":
+            return self.frameDecoder.feed(chunk)
+
+        stateVectors = self.packetDecoder.feed(chunk)
+        self.packetLengths = [len(stateVector) for stateVector in stateVectors]
+        if len(stateVectors) == 0:
+            return np.zeros(0, dtype=np.complex128)
+        amplitudes = np.concatenate(stateVectors)
+        amplitudes.real[np.abs(amplitudes.real) < self.roundingThreshold] = 0
+        amplitudes.imag[np.abs(amplitudes.imag) < self.roundingThreshold] = 0
+        self.packetAmplitudes += len(amplitudes)
+        return amplitudes
+
+# Decoder that also measures the readback: bytes/s, amplitudes/s, framing errors, amplitudes missing
+# compared to expectedAmplitudes and the gaps between chunks that come close to the end of data timeout
+class ReadbackMonitor():
+    def __init__(self, expectedAmplitudes=None, roundingThreshold = 0.00000001, endOfDataGap=0.5, gapWarning=0.1):
+        self.expectedAmplitudes = expectedAmplitudes
+        self.endOfDataGap = endOfDataGap
+        self.gapWarning = gapWarning
+        self.decoder = AutoDecoder(roundingThreshold)
+        self.reset()
+
+    def reset(self):
+        self.decoder.reset()
+        self.bytesReceived = 0
+        self.chunks = 0
+        self.firstTime = None
+        self.lastTime = None
+        self.maxGap = 0
+        self.longGaps = [] # (seconds since the first chunk, gap length) of gaps longer than gapWarning
+
+    def feed(self, chunk, timestamp=None):
+        if timestamp == None:
+            timestamp = time.time()
+        if self.firstTime == None:
+            self.firstTime = timestamp
+        elif timestamp - self.lastTime > self.maxGap:
+            self.maxGap = timestamp - self.lastTime
+        if self.lastTime != None and timestamp - self.lastTime > self.gapWarning:
+            self.longGaps.append((self.lastTime - self.firstTime, timestamp - self.lastTime))
+        self.lastTime = timestamp
+        self.bytesReceived += len(chunk)
+        self.chunks += 1
+        return self.decoder.feed(chunk)
+
+    def report(self):
+        duration = (self.lastTime - self.firstTime) if self.firstTime != None else 0
+        amplitudes = self.decoder.nDecoded
+        missing = None
+        if self.expectedAmplitudes != None:
+            missing = self.expectedAmplitudes - amplitudes
+        return {"bytes": self.bytesReceived, "chunks": self.chunks, "amplitudes": amplitudes,
+                "duration": duration,
+                "bytesPerSecond": self.bytesReceived / duration if duration > 0 else None,
+                "amplitudesPerSecond": amplitudes / duration if duration > 0 else None,
+                "format": self.decoder.mode,
+                "framingErrors": self.decoder.framingErrors,
+                "incompleteBytes": len(self.decoder.buffer),
+                "missingAmplitudes": missing,
+                "maxGap": self.maxGap,
+                "longGaps": list(self.longGaps),
+                "endOfDataGap": self.endOfDataGap}
+
+# yields the decoded amplitudes of every chunk of an iterable of bytes objects
+def decodeStream(chunks, roundingThreshold = 0.00000001):
+    decoder = AutoDecoder(roundingThreshold)
+    for chunk in chunks:
+        amplitudes = decoder.feed(chunk)
+        if len(amplitudes) > 0:
+            yield amplitudes
+
+def decodeStateVector(data, roundingThreshold = 0.00000001):
+    return AutoDecoder(roundingThreshold).feed(data)
+
+# produces the byte stream the FPGA sends for a state vector, values are truncated to the fixed point format
+def encodeStateVector(stateVector):
+    numbers = toFixedPoint(stateVector)
+    word = ((numbers["real"].astype(np.int64) & 0xFFFFFFFF) << 32 | (numbers["imag"].astype(np.int64) & 0xFFFFFFFF)).astype(np.uint64)
+
+    frames = np.empty((len(numbers), FRAME_LENGTH), dtype=np.uint8)
+    frames[:, 0] = START_BYTE
+    frames[:, -1] = END_BYTE
+    for i in range(9):
+        frames[:, i+1] = ((word >> np.uint64(57 - 7*i)) & np.uint64(0x7F)) << np.uint64(1)
+    frames[:, 10] = ((word & np.uint64(1)) << np.uint64(6)) << np.uint64(1)
+    return frames.tobytes()
+
+def printReadbackReport(report):
+    print(f"Received {report['amplitudes']} numbers ({report['bytes']} bytes) in {report['duration']:.3f}s", end="")
+    if report["bytesPerSecond"] != None:
+        print(f", {report['bytesPerSecond']:.0f} bytes/s, {report['amplitudesPerSecond']:.0f} numbers/s", end="")
+    print("")
+    if report["framingErrors"] > 0 or report["incompleteBytes"] > 0:
+        print(f"Framing errors: {report['framingErrors']}, bytes of incomplete numbers: {report['incompleteBytes']}")
+    if report["missingAmplitudes"]:
+        print(f"Missing numbers: {report['missingAmplitudes']}")
+    if len(report["longGaps"]) > 0:
+        print(f"{len(report['longGaps'])} gaps longer than the warning threshold, longest {report['maxGap']:.3f}s")
+
 def getSerialPorts(baudRate = 9600):
     ports = serial.tools.list_ports.comports(include_links=True)
     return [serial.Serial(port.device, baudRate, timeout=1) for port in ports],  [port.device for port in ports]
@@ -39,77 +228,86 @@ def sendByte(port, byte):
     except serial.SerialException as e:
         print(f"Error sending data: {e}")
 
-def readSerial(port, showEntireStateVector):
+def readSerial(port, showEntireStateVector, expectedAmplitudes=None):
     time.sleep(1)
 
     i = 0
-    current_number_bit_string = ""
+    monitor = ReadbackMonitor(expectedAmplitudes)
     last_data_time = time.time()
     transmitting = False
 
+    # read() blocks until data arrives or the end of data gap passed instead of polling in_waiting
+    port.timeout = monitor.endOfDataGap
     while True:
-        if time.time() - last_data_time > 0.5:
+        data = port.read(max(1, port.in_waiting))
+        if len(data) == 0 or time.time() - last_data_time > monitor.endOfDataGap:
             if transmitting:
                 print("End of data")
+                printReadbackReport(monitor.report())
                 transmitting = False
                 i = 0
+                monitor.reset()
 
-        if port.in_waiting:
+        if len(data) > 0:
             if not transmitting:
                 #new line
                 print("\n")
                 print("Start of data")
                 transmitting = True
-            data = port.read(port.in_waiting)
             last_data_time = time.time()
 
-            for byte in data:
-                    byte = format(byte, '08b')
-                    if byte == "00000001": # start byte
-                        current_number_bit_string = ""
+            amplitudes = monitor.feed(data, last_data_time)
+            for index in np.flatnonzero((np.abs(amplitudes.real) > 0.001) | showEntireStateVector):
+                print(i + index, amplitudes[index])
+            i += len(amplitudes)
 
-                    elif byte == "10000001": # end byte
-                        if len(current_number_bit_string) == 70:
-                            current_number_bit_string = current_number_bit_string[0:64]
+# returns the program as raw bytes, the binary image written by FPGAQCCompiler is used if it is
+# at least as new as the text program, otherwise the text program is parsed
+def readProgram(filepath, filename):
+    if filename.endswith(".prg"):
+        filename = filename[:-len(".prg")]
+    textPath = pathlib.Path(filepath) / pathlib.Path(f"{filename}.prg")
+    binaryPath = pathlib.Path(filepath) / pathlib.Path(f"{filename}.bin")
 
-                            c = convertToComplex(current_number_bit_string)
-                            if (c.real > 0.001 or c.real < -0.001) or showEntireStateVector:
-                                print(i, c)
-                                pass
-                            i += 1
+    if binaryPath.exists() and (not textPath.exists() or binaryPath.stat().st_mtime >= textPath.stat().st_mtime):
+        return binaryPath.read_bytes()
 
-                    else:
-                        current_number_bit_string += byte[0:7]
+    program = bytearray()
+    for line in textPath.read_text().splitlines():
+        byte = line.strip().split(" --")[0]
+        if byte == "":
+            continue
+        try:
+            program.append(int(byte, 2))
+        except Exception as e:
+            print(f"Error converting binary string to byte: {e}")
+    return bytes(program)
 
-def file_len(filePath):
-    with open(filePath) as f:
-        for i, l in enumerate(f):
-            pass
-    return i + 1
+# sends the program framed by the start/end byte in a few large writes and returns the achieved bytes/s,
+# with verbose=False nothing is printed and errors are raised to the caller
+def uploadProgram(port, filepath, filename, chunkSize=4096, verbose=True):
+    StartEndByte = bytes([0xFF])
 
-def uploadProgram(port, filepath, filename):
-    StartEndByte = "11111111"
-
-    if not filename.endswith(".prg"):
-        filename = filename + ".prg"
-    filePath = pathlib.Path(filepath) / pathlib.Path(filename)
     try:
-        sendByte(port = port, byte = int(StartEndByte, 2).to_bytes(1, byteorder='big')) #send start byte
-        print(f"Opening file {filename}...")
-        with open(filePath, 'r') as file:
-            total_lines = file_len(filePath)
-            for line in tqdm(file, total=total_lines, desc="Uploading"):
-                byte = line.strip().split(" --")[0]
-                try:
-                    byte_value = int(byte, 2)
-                    byte_data = byte_value.to_bytes(1, byteorder='big')
-                    sendByte(port = port, byte = byte_data)
-
-                except Exception as e:
-                    print(f"Error converting binary string to byte: {e}")
-
-        sendByte(port = port, byte = int(StartEndByte, 2).to_bytes(1, byteorder='big')) #send end byte
-        print("File uploaded")
+        if verbose:
+            print(f"Opening file {filename}...")
+        image = StartEndByte + readProgram(filepath, filename) + StartEndByte
+
+        startTime = time.time()
+        with tqdm(total=len(image), desc="Uploading", unit="B", disable=not verbose) as progress:
+            for i in range(0, len(image), chunkSize):
+                chunk = image[i:i+chunkSize]
+                port.write(chunk)
+                progress.update(len(chunk))
+        port.flush()
+        endTime = time.time()
+
+        bytesPerSecond = len(image) / max(endTime-startTime, 1e-9)
+        if verbose:
+            print(f"File uploaded ({len(image)} bytes, {bytesPerSecond:.0f} bytes/s)")
+        return bytesPerSecond
 
     except Exception as e:
-        print(f"Error uploading program: {e}")
\ No newline at end of file
+        if not verbose:
+            raise
+        print(f"Error uploading program: {e}")
@@ -0,0 +1,109 @@
+from QBridge.simulators import CustomQCSimulator
+from QBridge.protocol import fromFixedPoint, numberDtype
+import numpy as np
+
+# Compares a received state vector with a reference while it arrives. feed() takes the next chunk
+# of received amplitudes (in order) and returns False once the comparison can stop: as soon as one
+# amplitude differs by more than tolerance if stopOnViolation is set. Amplitudes that violate the
+# tolerance are kept as per index diffs (at most maxDiffs of them). The reference can be any array
+# like, also a memory map of complex128 or fixed point numbers.
+class StateVectorVerifier():
+    def __init__(self, reference, tolerance=1e-6, stopOnViolation=True, maxDiffs=100):
+        self.reference = reference
+        self.tolerance = tolerance
+        self.stopOnViolation = stopOnViolation
+        self.maxDiffs = maxDiffs
+        self.compared = 0
+        self.maxError = 0
+        self.maxErrorIndex = None
+        self.squaredError = 0
+        self.overlap = 0
+        self.normReceived = 0
+        self.normReference = 0
+        self.violations = 0
+        self.diffs = []
+        self.stopped = False
+
+    def _referenceChunk(self, start, stop):
+        chunk = self.reference[start:stop]
+        return fromFixedPoint(chunk) if chunk.dtype == numberDtype else np.asarray(chunk, dtype=np.complex128)
+
+    def feed(self, amplitudes):
+        if self.stopped:
+            return False
+        amplitudes = fromFixedPoint(amplitudes) if amplitudes.dtype == numberDtype else np.asarray(amplitudes, dtype=np.complex128)
+        start = self.compared
+        stop = min(start + len(amplitudes), len(self.reference))
+        amplitudes = amplitudes[:stop-start]
+        reference = self._referenceChunk(start, stop)
+
+        difference = np.abs(amplitudes - reference)
+        if len(difference) > 0 and difference.max() > self.maxError:
+            self.maxError = float(difference.max())
+            self.maxErrorIndex = start + int(difference.argmax())
+        self.squaredError += float(np.dot(difference, difference))
+        self.overlap += np.vdot(reference, amplitudes)
+        self.normReceived += float(np.vdot(amplitudes, amplitudes).real)
+        self.normReference += float(np.vdot(reference, reference).real)
+
+        violating = np.flatnonzero(difference > self.tolerance)
+        self.violations += len(violating)
+        for index in violating[:max(0, self.maxDiffs - len(self.diffs))]:
+            self.diffs.append({"index": start + int(index), "received": complex(amplitudes[index]),
+                               "reference": complex(reference[index]), "error": float(difference[index])})
+        self.compared = stop
+
+        if (self.stopOnViolation and len(violating) > 0) or self.compared >= len(self.reference):
+            self.stopped = True
+        return not self.stopped
+
+    def report(self):
+        complete = self.compared >= len(self.reference)
+        fidelity = None
+        if self.normReceived > 0 and self.normReference > 0:
+            fidelity = float(abs(self.overlap)**2 / (self.normReceived * self.normReference))
+        return {"passed": complete and self.violations == 0,
+                "complete": complete,
+                "stoppedEarly": self.stopped and not complete,
+                "compared": self.compared,
+                "expected": len(self.reference),
+                "tolerance": self.tolerance,
+                "maxError": self.maxError,
+                "maxErrorIndex": self.maxErrorIndex,
+                "l2Error": self.squaredError**0.5,
+                "fidelity": fidelity, # over the compared part
+                "violations": self.violations,
+                "diffs": list(self.diffs)}
+
+# compares two complete (or memory mapped) state vectors chunk by chunk
+def verifyStateVectors(received, reference, tolerance=1e-6, stopOnViolation=True, chunkSize=2**16, maxDiffs=100):
+    if len(received) != len(reference):
+        raise ValueError("state vectors have different lengths")
+    verifier = StateVectorVerifier(reference, tolerance, stopOnViolation, maxDiffs)
+    for start in range(0, len(received), chunkSize):
+        if not verifier.feed(received[start:start+chunkSize]):
+            break
+    return verifier.report()
+
+# consumes chunks of amplitudes as they are decoded, e.g. from StateVectorDecoder.feed, and stops
+# reading from the iterable once the verifier is done
+def verifyStream(chunks, reference, tolerance=1e-6, stopOnViolation=True, maxDiffs=100):
+    verifier = StateVectorVerifier(reference, tolerance, stopOnViolation, maxDiffs)
+    for chunk in chunks:
+        if not verifier.feed(chunk):
+            break
+    return verifier.report()
+
+# reference state vector of the circuit, taken from the CompileCache by circuit hash if one is given
+def referenceStateVector(circuit, cache=None, engine="vectorized"):
+    if cache != None:
+        return cache.referenceStateVector(circuit, engine=engine)
+    return CustomQCSimulator(circuit.nQubits, engine=engine).run(circuit.circuit)
+
+# received is a state vector or an iterable of chunks, the FPGA truncates to 30 fractional bits and
+# accumulates the error over the gates, hence the default tolerance
+def verifyCircuit(received, circuit, cache=None, tolerance=1e-6, stopOnViolation=True, engine="vectorized"):
+    reference = referenceStateVector(circuit, cache, engine)
+    if isinstance(received, np.ndarray):
+        return verifyStateVectors(received, reference, tolerance, stopOnViolation)
+    return verifyStream(received, reference, tolerance, stopOnViolation)
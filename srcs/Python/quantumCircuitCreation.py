@@ -1,10 +1,13 @@
 from QBridge.quantumCircuit import QuantumCircuit
-from QBridge.simulators import runCustomSimulation, runQiskitSimulation
-from QBridge.compiler import FPGAQCCompiler
+from QBridge.simulators import runCustomSimulation, runQiskitSimulation, formatStateVector
+from QBridge.cache import CompileCache, circuitHash
+from QBridge.resultStore import ResultStore
 import pathlib
 
 ROOT_DIR = pathlib.Path(__file__).parent
 FPGAProgramsPath = ROOT_DIR / pathlib.Path("FPGAPrograms") # Path to the FPGA programs
+compileCachePath = ROOT_DIR / pathlib.Path("compileCache") # Path to the cache of compiled programs
+resultStorePath = ROOT_DIR / pathlib.Path("results") # Path to the archive of simulated and measured state vectors
 
 
 circuit = QuantumCircuit(nQubits=2) # create a quantum circuit with 2 qubits
@@ -20,17 +23,22 @@ circuit.cnot(1, 0)
 
 circuit.visualise() #visualise the circuit using the quirk online simulator
 
-# run the custom simulator and the qiskit simulator to compare the results
-stateVector, time = runCustomSimulation(circuit)
-print(stateVector)
-print("Custom Circuit Runtime: ", time)
+# run the custom simulator and the qiskit simulator to compare the results, both are kept in the result store
+resultStore = ResultStore(resultStorePath)
+stateVector, timing = runCustomSimulation(circuit)
+print("".join(formatStateVector(stateVector)))
+print("Custom Circuit Runtime: ", timing["execution"])
+customRun = resultStore.add(stateVector, circuitHash(circuit), backend="custom", wallTime=timing["execution"])
 
 print("\n\n\n")
 
-stateVector, time = runQiskitSimulation(circuit)
-print(stateVector)
-print("Qiskit Circuit Runtime: ", time)
+stateVector, timing = runQiskitSimulation(circuit)
+print("".join(formatStateVector(stateVector)))
+print("Qiskit Circuit Runtime: ", timing["execution"], "(transpile: ", timing["transpile"], ")")
+qiskitRun = resultStore.add(stateVector, circuitHash(circuit), backend="Qiskit", wallTime=timing["execution"])
+print("Custom vs Qiskit: ", resultStore.compare(customRun, qiskitRun))
 
-# compile the circuit to a file that can be uploaded to the FPGA
-compiler = FPGAQCCompiler()
-compiler.compile(circuit=circuit, filepath=FPGAProgramsPath, filename="TestProgram")
\ No newline at end of file
+# compile the circuit to a file that can be uploaded to the FPGA, unchanged circuits are taken from the cache
+compileCache = CompileCache(compileCachePath)
+compileCache.compile(circuit=circuit, filepath=FPGAProgramsPath, filename="TestProgram")
+print("Compile cache: ", compileCache.stats())
\ No newline at end of file
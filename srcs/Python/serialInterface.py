@@ -1,12 +1,15 @@
-from QBridge.tools import convertToComplex, getSerialPorts, sendByte, uploadProgram
+from QBridge.tools import printReadbackReport, getSerialPorts
+from QBridge.serialConnection import BoardConnection
+from QBridge.resultStore import ResultStore
 import threading
+import queue
 import sys
 import pathlib
-import time
-import serial
+import numpy as np
 
 ROOT_DIR = pathlib.Path(__file__).parent
 FPGAProgramsPath = ROOT_DIR / pathlib.Path("FPGAPrograms") # Path to the FPGA programs
+resultStorePath = ROOT_DIR / pathlib.Path("results") # Path to the archive of received state vectors
 
 roundingThreshold = 0.000000001 # rounding threshold for complex numbers
 showEntireStateVector = False # Set to True to only show non-zero elements
@@ -18,15 +21,19 @@ helpInfo = "Commands: \n" \
             "send <byte String>: send a byte to the FPGA\n" \
             "upload <file name>: upload a file to the FPGA\n" \
             "getRunTime <HexCode>: get the run time of a program assumung the timer runs with a 100MHz clock frequency\n" \
-            "connect <baudRate>: connect to the FPGA with the specified baud rate\n"
+            "connect <baudRate>: connect to the FPGA with the specified baud rate\n" \
+            "boards: list the connected boards\n" \
+            "select <board number>: send and upload to this board\n"
 
-terminate = False
-port = None
+boards = [] # connected boards, they all put their state vectors onto the results queue
+results = queue.Queue()
+board = None # board that send and upload go to
+uploadedPrograms = {} # name of the last program uploaded to every board
+resultStore = ResultStore(resultStorePath)
 
-# handles user input to connect to a serial port
+# handles user input to connect to a serial port, 'all' connects to every port
 def connectToSerialPort(baudRate):
-    global port
-    port = None
+    global board
     ports, portnames = getSerialPorts(baudRate=baudRate)
     print("Available ports: ")
     if len(ports) == 0:
@@ -37,82 +44,50 @@ def connectToSerialPort(baudRate):
             print(f"{i}: {portnames[i]}")
     
 
-        while True:
-            print("Which port do you want to connect to? Type a number and press enter")
-            portNumber = input()
-            try:
-                port = ports[int(portNumber)]
-                portname = portnames[int(portNumber)]
-            except Exception as e:
-                print(f"Error connecting to port: {e}")
-                print("Type 'connect <baudrate>' to connect to try again.")
-                port = None
-
-            if port is not None:
-                print(f"Connected to {portname} with baud rate {port.baudrate}")
-
-            return 
-
-# waits for data from the serial port, converts it to complex floats, and prints it to the terminal
-def waitForSerialData(showEntireStateVector, roundingThreshold):
-    global port
-    time.sleep(1)
-
-    i = 0
-    current_number_bit_string = ""
-    last_data_time = time.time()
-    transmitting = False
-
+        print("Which port do you want to connect to? Type a number or 'all' and press enter")
+        portNumber = input()
+        try:
+            selection = range(len(ports)) if portNumber == "all" else [int(portNumber)]
+            for i in selection:
+                boards.append(BoardConnection(ports[i], portnames[i], results, roundingThreshold))
+                board = boards[-1]
+                print(f"Connected to {portnames[i]} with baud rate {ports[i].baudrate}")
+        except Exception as e:
+            print(f"Error connecting to port: {e}")
+            print("Type 'connect <baudrate>' to connect to try again.")
+
+# blocks on the results queue and prints every state vector received by any board
+def printSerialData(showEntireStateVector):
+    global board
     while True:
-        if port == None:
-            time.sleep(10)
-            continue
-
-        if time.time() - last_data_time > 0.5:
-            if transmitting:
-                print("End of data")
-                transmitting = False
-                i = 0
-
-        try: 
-            if port.in_waiting:
-                if not transmitting:
-                    #new line
-                    print("\n")
-                    print("Start of data")
-                    transmitting = True
-                data = port.read(port.in_waiting)
-                last_data_time = time.time()
-
-                for byte in data:
-                        byte = format(byte, '08b')
-                        if byte == "00000001": # start byte
-                            current_number_bit_string = ""
-
-                        elif byte == "10000001": # end byte
-                            if len(current_number_bit_string) == 70:
-                                current_number_bit_string = current_number_bit_string[0:64]
-
-                                c = convertToComplex(current_number_bit_string, roundingThreshold)
-                                if c.real != 0 or showEntireStateVector:
-                                    print(i, c)
-                                    pass
-                                i += 1
-
-                        else:
-                            current_number_bit_string += byte[0:7]
-
-        except serial.SerialException as e:
-            print(f"Error reading data: {e}")
+        result = results.get()
+        if "error" in result:
+            print(f"Error reading data from {result['board']}: {result['error']}")
+            if all(connection.connected for connection in boards):
+                continue
             print("Disconnected from serial port")
             print("")
-            port = None
+            for connection in [connection for connection in boards if not connection.connected]:
+                boards.remove(connection)
+                if board == connection:
+                    board = boards[0] if len(boards) > 0 else None
+            continue
+
+        print("\n")
+        print(f"Data from {result['board']}")
+        stateVector = result["stateVector"]
+        for index in np.flatnonzero((stateVector.real != 0) | showEntireStateVector):
+            print(index, stateVector[index])
+        printReadbackReport(result["report"])
+        if len(stateVector) > 0 and len(stateVector) & (len(stateVector)-1) == 0:
+            runId = resultStore.add(stateVector, backend="FPGA", fixedPoint=True, board=result["board"],
+                                    program=uploadedPrograms.get(result["board"]))
+            print(f"Stored as run {runId}")
 
 # handles user interaction with the terminal
 def terminalInteraction():
-    global port
-    global terminate
-    
+    global board
+
     connectToSerialPort(DEFAULT_BAUD_RATE)
 
     while True:
@@ -120,14 +95,13 @@ def terminalInteraction():
         userInput = input()
 
         if userInput == "exit":
-            terminate = True
             break
 
         elif userInput == "help":
             print(helpInfo)
 
         elif userInput.split(" ")[0] == "send":
-            if port == None:
+            if board == None:
                 print("Not connected to serial port")
                 continue
             else:
@@ -136,7 +110,7 @@ def terminalInteraction():
                     byte_value = int(byteInput, 2)
                     byte_data = byte_value.to_bytes(1, byteorder='big')
                     print(f"Sending byte: {byte_data}")
-                    sendByte(port = port, byte = byte_data)
+                    board.send(byte_data)
 
                 except Exception as e:
                     print(f"Error sending byte: {e}")
@@ -144,13 +118,14 @@ def terminalInteraction():
 
 
         elif userInput.split(" ")[0] == "upload":
-            if port == None:
+            if board == None:
                 print("Not connected to FPGA")
                 continue
             else:
                 try:
                     filename = userInput.split(" ")[1]
-                    uploadProgram(port = port, filepath = FPGAProgramsPath, filename = filename)
+                    board.upload(filepath = FPGAProgramsPath, filename = filename)
+                    uploadedPrograms[board.name] = filename
                 except Exception as e:
                     print(f"Error uploading program: {e}")
         
@@ -172,7 +147,18 @@ def terminalInteraction():
                 print(f"No valid Baud rate given: {e}")
                 print(f"Trying to connect with default baud rate {DEFAULT_BAUD_RATE}")
                 connectToSerialPort(DEFAULT_BAUD_RATE)
-        
+
+        elif userInput == "boards":
+            for i in range(len(boards)):
+                print(f"{i}: {boards[i].name}{' (selected)' if boards[i] == board else ''}")
+
+        elif userInput.split(" ")[0] == "select":
+            try:
+                board = boards[int(userInput.split(" ")[1])]
+                print(f"Selected {board.name}")
+            except Exception as e:
+                print(f"No valid board number given: {e}")
+
         else:
             print("Unknown command, type 'help' for a list of commands")
 
@@ -180,19 +166,15 @@ def terminalInteraction():
 print("Welcome to the Quantum Bridge terminal interface")
 print("Type 'help' for a list of commands")
 
-# start threads for reading and writing to the serial port
-read_thread = threading.Thread(target=waitForSerialData, args=(showEntireStateVector, roundingThreshold))
-read_thread.daemon = True
-read_thread.start()
-
-write_thread = threading.Thread(target=terminalInteraction, args=())
-write_thread.daemon = True
-write_thread.start()
+# the boards read in their own threads, printing blocks on the results queue and the terminal runs here
+print_thread = threading.Thread(target=printSerialData, args=(showEntireStateVector,))
+print_thread.daemon = True
+print_thread.start()
 
-# wait for the threads to finish
-while not terminate:
-    pass
+terminalInteraction()
 
 # exit the program
 print("Exiting program")
+for connection in boards:
+    connection.close()
 sys.exit()
\ No newline at end of file